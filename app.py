@@ -1,29 +1,77 @@
-from flask import Flask, render_template, abort, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, Response, render_template, abort, request, redirect, url_for, session, flash, jsonify, g, has_request_context, stream_with_context, get_template_attribute
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from data import (
     lessons, projects, roadmap_phases,
-    get_lesson_by_id, get_project_by_id,
-    common_mistakes, code_examples,
-    get_common_mistakes_by_category, search_code_examples
+    get_lesson_by_id, get_project_by_id, get_lessons_by_phase,
+    get_lesson_neighbors, get_project_neighbors,
+    common_mistakes, code_examples, code_example_categories, related_lessons_map,
+    get_common_mistakes_by_category, get_code_examples_by_category, search_code_examples,
+    get_code_examples_for_lesson, get_common_mistakes_for_lesson
+)
+from assets import fingerprint_static_url, get_assets, send_asset
+from compression import compress_response
+from content import lesson_sections, render_cache, render_lesson_html, source_version
+from highlight import highlight_cache, highlight_filter
+from http_cache import conditional_page, page_cache, site_version
+from lru import LRUCache
+import metrics
+from profiler import RequestProfiler, profiling_enabled
+from search_index import get_search_index
+from watcher import WATCH_LESSONS, start_watcher
+from progress_store import KIND_KEYS, create_progress_store, current_streak
+from user_store import (
+    DEV_USERS, SEED_DEV_USERS, USER_CACHE_SIZE, USER_CACHE_TTL, USER_DB, SqliteUserStore,
 )
-import markdown
 import os
-import json
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key")
 
+# ルート・区間ごとの処理時間を記録し /metrics で公開する（最初に登録して全体を計測する）
+metrics.init_app(app)
+# ビルド済みの静的ファイルはハッシュ入りのURLにする（python -m build_assets）
+app.url_defaults(fingerprint_static_url)
+# {{ code|highlight('python') }}: data.py のコード例をキャッシュ付きでハイライトする
+app.add_template_filter(highlight_filter, 'highlight')
+# 一定サイズ以上のテキストはgzipで返す
+app.after_request(compress_response)
+# PROFILE_SAMPLE_RATE / PROFILE_TOKEN を設定したときだけリクエストをプロファイルする
+if profiling_enabled():
+    app.wsgi_app = RequestProfiler(app.wsgi_app, app.url_map)
+
 login_manager = LoginManager()
 login_manager.login_view = "login"
 login_manager.init_app(app)
 
-DATA_USERS = {
-    "user@example.com": {"password": "testpass", "name": "受講生"}
-}
+# ユーザーの保存先（最初にログイン・load_user で使うときに開く。スクリプトから差し替えられる）
+user_store = None
+_user_store_lock = threading.Lock()
+# load_user がリクエストごとにデータベースを引かないよう User を一定時間保持する
+user_cache = LRUCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
 PROGRESS_DIR = "progress"
-os.makedirs(PROGRESS_DIR, exist_ok=True)
+# 進捗の保存先: "json"（progress/<email>.json）または "sqlite"
+PROGRESS_BACKEND = os.environ.get("PROGRESS_BACKEND", "json")
+PROGRESS_DB = os.environ.get("PROGRESS_DB", os.path.join(PROGRESS_DIR, "progress.db"))
+progress_store = create_progress_store(PROGRESS_BACKEND, PROGRESS_DIR, PROGRESS_DB)
+
+metrics.register_cache("render", render_cache.stats)
+metrics.register_cache("page", page_cache.stats)
+metrics.register_cache("highlight", highlight_cache.stats)
+metrics.register_cache("user", user_cache.stats)
+# progress_store は差し替えられることがあるので、呼び出し時点のものを見る
+metrics.register_cache("progress", lambda: progress_store.cache_stats()
+                       if hasattr(progress_store, "cache_stats") else {"hits": 0, "misses": 0})
+
+MARKDOWN_NOT_FOUND_HTML = "<p>Markdownファイルが見つかりませんでした。</p>"
+# レッスン詳細をhead・ナビから順に送り、本文は節ごとに送る（0で一括描画）
+STREAM_LESSONS = os.environ.get("STREAM_LESSONS", "1") == "1"
+# テンプレートの本文の位置に入れる目印（ここで前後に分けて送る）
+CONTENT_PLACEHOLDER = "<!--lesson-content-->"
+# レッスン詳細で最初から表示する節の数（残りはスクロールに合わせて読み込む）
+LESSON_INLINE_SECTIONS = int(os.environ.get("LESSON_INLINE_SECTIONS", "3"))
 
 PHASE3_OVERVIEW_POINTS = [
     "静的なHTMLを正しく構造化して情報を整理する",
@@ -57,207 +105,199 @@ class User(UserMixin):
         self.name = name
 
 
+def get_user_store() -> SqliteUserStore:
+    """ユーザーの保存先（import時にはデータベースを開かない）"""
+    global user_store
+    if user_store is None:
+        with _user_store_lock:
+            if user_store is None:
+                store = SqliteUserStore(USER_DB)
+                # 新しく作ったデータベースでも user@example.com / testpass でログインできるようにする
+                if SEED_DEV_USERS and store.count() == 0:
+                    store.seed(DEV_USERS)
+                user_store = store
+    return user_store
+
+
 @login_manager.user_loader
 def load_user(user_id: str):
-    data = DATA_USERS.get(user_id)
-    if not data:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    record = get_user_store().get(user_id)
+    if not record:
         return None
-    return User(email=user_id, name=data.get("name", user_id))
+    user = User(email=record["email"], name=record["name"])
+    user_cache.put(user_id, user)
+    return user
 
 
 def load_progress(email: str):
-    path = os.path.join(PROGRESS_DIR, f"{email}.json")
-    if not os.path.exists(path):
-        return {"lessons": {}, "projects": {}, "tasks": {}, "favorites": [], "study_dates": [], "notes": {}}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            # 既存データとの互換性のため
-            if "favorites" not in data:
-                data["favorites"] = []
-            if "study_dates" not in data:
-                data["study_dates"] = []
-            if "notes" not in data:
-                data["notes"] = {}
-            return data
-    except Exception:
-        return {"lessons": {}, "projects": {}, "tasks": {}, "favorites": [], "study_dates": [], "notes": {}}
-
-
-def save_progress(email: str, progress: dict):
-    path = os.path.join(PROGRESS_DIR, f"{email}.json")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(progress, f, ensure_ascii=False, indent=2)
+    """進捗を読み込む（同じリクエスト内では一度だけ）"""
+    if not has_request_context():
+        return progress_store.load(email)
+    memo = g.setdefault("progress_memo", {})
+    if email not in memo:
+        with metrics.timed("load_progress"):
+            memo[email] = progress_store.load(email)
+    return memo[email]
+
+
+def forget_progress(email: str):
+    """リクエスト内で読み込んだ進捗を破棄（書き込み後に使う）"""
+    if has_request_context():
+        g.setdefault("progress_memo", {}).pop(email, None)
+
+
+def update_progress(email: str, apply):
+    """進捗を変更する（ProgressStore.update() を参照）"""
+    forget_progress(email)
+    # 読み込み・変更・保存をまとめて save_progress として計測する
+    with metrics.timed("save_progress"):
+        return progress_store.update(email, apply)
+
+
+def markdown_page_parts(item_id: str, item: dict | None) -> list | None:
+    """Markdownを表示するページのETag用の値（存在しないIDならNone）"""
+    if not item:
+        return None
+    return [source_version(item_id) or ("missing", 0)]
+
+
+def lesson_page_parts(lesson_id):
+    return markdown_page_parts(lesson_id, get_lesson_by_id(lesson_id))
+
+
+def lesson_section_parts(lesson_id, index):
+    return lesson_page_parts(lesson_id)
+
+
+def project_page_parts(project_id):
+    return markdown_page_parts(project_id, get_project_by_id(project_id))
+
 
 @app.route('/')
+@conditional_page()
 def index():
     """トップページ（LP的なページ）"""
     return render_template('index.html')
 
 
 @app.route('/roadmap')
+@conditional_page()
 def roadmap():
     """学習ロードマップ"""
     return render_template('roadmap.html', phases=roadmap_phases)
 
 
 @app.route('/lessons')
+@conditional_page(shared=True)
 def lessons_list():
-    """レッスン一覧"""
+    """レッスン一覧（全員共通のHTML。進捗やお気に入りは /api/me/state で反映）"""
     # フェーズごとにレッスンを分類
-    phase1_lessons = [lesson for lesson in lessons if lesson.get('phase') == 1]
-    phase3_lessons = [lesson for lesson in lessons if lesson.get('phase') == 3]
-    progress_data = None
-    favorites = []
-    if current_user.is_authenticated:
-        progress_data = load_progress(current_user.email)
-        favorites = progress_data.get("favorites", [])
-
-    phase3_total = len(phase3_lessons)
-    phase3_completed = 0
-    if progress_data:
-        completed_map = progress_data.get("lessons", {})
-        phase3_completed = sum(1 for lesson in phase3_lessons if completed_map.get(lesson["id"]))
-    phase3_progress = {
-        "show": bool(progress_data),
-        "completed": phase3_completed,
-        "total": phase3_total,
-        "percent": int((phase3_completed / phase3_total) * 100) if phase3_total else 0
-    }
-
-    tasks_progress = progress_data.get("tasks", {}) if progress_data else {}
-    phase3_tasks = []
-    for task in PHASE3_PRACTICAL_TASKS:
-        item = task.copy()
-        item["completed"] = bool(tasks_progress.get(task["id"]))
-        phase3_tasks.append(item)
-
+    phase1_lessons = get_lessons_by_phase(1)
+    phase3_lessons = get_lessons_by_phase(3)
     return render_template('lessons.html', 
                          phase1_lessons=phase1_lessons,
                          phase3_lessons=phase3_lessons,
                          all_lessons=lessons,
                          phase3_overview=PHASE3_OVERVIEW_POINTS,
                          phase3_timeline=PHASE3_TIMELINE,
-                         phase3_tasks=phase3_tasks,
-                         phase3_progress=phase3_progress,
-                         favorites=favorites if current_user.is_authenticated else [])
+                         phase3_tasks=PHASE3_PRACTICAL_TASKS)
 
 
 @app.route('/lessons/<lesson_id>')
+@conditional_page(lesson_page_parts, shared=True)
 def lesson_detail(lesson_id):
     """レッスン詳細（Markdown表示）"""
     lesson = get_lesson_by_id(lesson_id)
     if not lesson:
         abort(404)
     
-    # 前後のレッスンを取得
-    current_phase = lesson.get('phase')
-    phase_lessons = [lesson_item for lesson_item in lessons if lesson_item.get('phase') == current_phase]
-    
-    # 現在のレッスンのインデックスを見つける
-    current_index = None
-    for i, lesson_item in enumerate(phase_lessons):
-        if lesson_item['id'] == lesson_id:
-            current_index = i
-            break
-    
-    prev_lesson = None
-    next_lesson = None
-    
-    if current_index is not None:
-        # 前のレッスン
-        if current_index > 0:
-            prev_lesson = phase_lessons[current_index - 1]
-        # 次のレッスン
-        if current_index < len(phase_lessons) - 1:
-            next_lesson = phase_lessons[current_index + 1]
-    
-    # Markdownファイルを読み込む
-    markdown_path = f"lessons/{lesson_id}.md"
-    content = ""
-    if os.path.exists(markdown_path):
-        with open(markdown_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        # MarkdownをHTMLに変換
-        content = markdown.markdown(content, extensions=['extra', 'codehilite'])
-    else:
-        content = "<p>Markdownファイルが見つかりませんでした。</p>"
-    
-    completed = False
-    is_favorite = False
-    note = ""
-    if current_user.is_authenticated:
-        pg = load_progress(current_user.email)
-        completed = bool(pg.get("lessons", {}).get(lesson_id))
-        favorites = pg.get("favorites", [])
-        is_favorite = f"lesson:{lesson_id}" in favorites
-        notes = pg.get("notes", {})
-        note = notes.get(f"lesson:{lesson_id}", "")
-
-    return render_template('lesson_detail.html', 
-                         lesson=lesson, 
-                         content=content,
-                         prev_lesson=prev_lesson,
-                         next_lesson=next_lesson,
-                         completed=completed,
-                         is_favorite=is_favorite,
-                         note=note)
+    # 前後のレッスンを取得（同じフェーズ内）
+    prev_lesson, next_lesson = get_lesson_neighbors(lesson_id)
+    context = dict(lesson=lesson,
+                   prev_lesson=prev_lesson,
+                   next_lesson=next_lesson,
+                   related_examples=get_code_examples_for_lesson(lesson_id),
+                   related_mistakes=get_common_mistakes_for_lesson(lesson_id))
+    # ?all=1 はすべての節を最初から表示する（JavaScriptが無効な場合のリンク先）
+    show_all = request.args.get('all') == '1'
+    # フラッシュメッセージを消す変更はストリーミング中だとセッションに保存されないので一括描画する
+    if STREAM_LESSONS and "_flashes" not in session:
+        return Response(stream_with_context(stream_lesson_page(lesson_id, show_all, context)),
+                        mimetype='text/html')
+
+    content = "".join(lesson_body_parts(lesson_id, show_all))
+    return render_template('lesson_detail.html', content=content, **context)
+
+
+def lesson_body_parts(lesson_id: str, show_all: bool = False):
+    """目次と節ごとのHTML（LESSON_INLINE_SECTIONS 以降の節は読み込み用の枠だけ）"""
+    # MarkdownをHTMLに変換して節に区切る（変換結果はキャッシュされる）
+    sections = lesson_sections(lesson_id)
+    if sections is None:
+        yield MARKDOWN_NOT_FOUND_HTML
+        return
+    yield get_template_attribute('lesson_sections.html', 'toc')(sections)
+    render_section = get_template_attribute('lesson_sections.html', 'section')
+    render_pending = get_template_attribute('lesson_sections.html', 'pending')
+    for section in sections:
+        if show_all or section["index"] < LESSON_INLINE_SECTIONS:
+            yield render_section(section)
+        else:
+            yield render_pending(lesson_id, section)
+
+
+def stream_lesson_page(lesson_id: str, show_all: bool, context: dict):
+    """head・ナビ・CSSとレッスンの見出しを先に送り、Markdownの本文を節ごとに送る"""
+    shell = render_template('lesson_detail.html', content=CONTENT_PLACEHOLDER, **context)
+    head, tail = shell.split(CONTENT_PLACEHOLDER, 1)
+    yield head
+    yield from lesson_body_parts(lesson_id, show_all)
+    yield tail
+
+
+@app.route('/api/lessons/<lesson_id>/sections/<int:index>')
+@conditional_page(lesson_section_parts, shared=True)
+def api_lesson_section(lesson_id, index):
+    """レッスンの1節分のHTML（lesson-sections.js がスクロールに合わせて読み込む）"""
+    if not get_lesson_by_id(lesson_id):
+        abort(404)
+    sections = lesson_sections(lesson_id) or []
+    if index >= len(sections):
+        abort(404)
+    section = sections[index]
+    return jsonify({"index": index, "title": section["title"], "html": section["html"]})
 
 
 @app.route('/projects')
+@conditional_page(shared=True)
 def projects_list():
     """ミニアプリ一覧"""
-    favorites = []
-    if current_user.is_authenticated:
-        progress = load_progress(current_user.email)
-        favorites = progress.get("favorites", [])
-    return render_template('projects.html', projects=projects, favorites=favorites if current_user.is_authenticated else [])
+    return render_template('projects.html', projects=projects)
 
 @app.route('/projects/<project_id>')
+@conditional_page(project_page_parts, shared=True)
 def project_detail(project_id):
     """ミニアプリ詳細（Markdown表示: lessons/project-xx.md）"""
     project = get_project_by_id(project_id)
     if not project:
         abort(404)
-    markdown_path = f"lessons/{project_id}.md"
-    content = ""
-    if os.path.exists(markdown_path):
-        with open(markdown_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        content = markdown.markdown(content, extensions=['extra', 'codehilite'])
-    else:
-        content = "<p>Markdownファイルが見つかりませんでした。</p>"
+    content = render_lesson_html(project_id)
+    if content is None:
+        content = MARKDOWN_NOT_FOUND_HTML
     # 前後ナビ（projects配列順）
-    ids = [p['id'] for p in projects]
-    prev_project = None
-    next_project = None
-    if project_id in ids:
-        idx = ids.index(project_id)
-        if idx > 0:
-            prev_project = get_project_by_id(ids[idx - 1])
-        if idx < len(ids) - 1:
-            next_project = get_project_by_id(ids[idx + 1])
-    completed = False
-    is_favorite = False
-    note = ""
-    if current_user.is_authenticated:
-        pg = load_progress(current_user.email)
-        completed = bool(pg.get("projects", {}).get(project_id))
-        favorites = pg.get("favorites", [])
-        is_favorite = f"project:{project_id}" in favorites
-        notes = pg.get("notes", {})
-        note = notes.get(f"project:{project_id}", "")
+    prev_project, next_project = get_project_neighbors(project_id)
 
     return render_template('project_detail.html',
                            project=project,
                            content=content,
                            prev_project=prev_project,
-                           next_project=next_project,
-                           completed=completed,
-                           is_favorite=is_favorite,
-                           note=note)
+                           next_project=next_project)
 
 @app.route('/phase2')
+@conditional_page()
 def phase2():
     """Phase2ページ（ミニアプリ制作の概要と導線）"""
     phase2_info = None
@@ -271,18 +311,21 @@ def phase2():
 
 
 @app.route('/portfolio')
+@conditional_page()
 def portfolio():
     """最終ポートフォリオ課題"""
     return render_template('portfolio.html')
 
 
 @app.route('/faq')
+@conditional_page()
 def faq():
     """よくある質問"""
     return render_template('faq.html')
 
 
 @app.route('/common-mistakes')
+@conditional_page()
 def common_mistakes_page():
     """よくあるつまずきポイント集"""
     category = request.args.get('category', '')
@@ -290,7 +333,7 @@ def common_mistakes_page():
     return render_template('common_mistakes.html', 
                          mistakes=mistakes, 
                          all_mistakes=common_mistakes,
-                         all_lessons=lessons,
+                         related_lessons=related_lessons_map,
                          selected_category=category)
 
 
@@ -301,8 +344,8 @@ def dashboard():
     progress = load_progress(current_user.email)
     
     # Phase別のレッスン数と完了数
-    phase1_lessons = [l for l in lessons if l.get('phase') == 1]
-    phase3_lessons = [l for l in lessons if l.get('phase') == 3]
+    phase1_lessons = get_lessons_by_phase(1)
+    phase3_lessons = get_lessons_by_phase(3)
     
     completed_lessons = progress.get("lessons", {})
     completed_projects = progress.get("projects", {})
@@ -330,30 +373,8 @@ def dashboard():
         "percent": int((projects_completed / len(projects) * 100)) if projects else 0
     }
     
-    # 学習ストリーク（連続学習日数）
-    study_dates = progress.get("study_dates", [])
-    streak = 0
-    if study_dates:
-        # 日付文字列を日付オブジェクトに変換してソート
-        dates = sorted([datetime.strptime(d, "%Y-%m-%d") for d in study_dates if d])
-        today = datetime.now().date()
-        check_date = today
-        
-        # 今日または昨日から逆順にカウント
-        for i in range(len(dates) - 1, -1, -1):
-            date_obj = dates[i].date()
-            if date_obj == check_date or date_obj == check_date - timedelta(days=1):
-                streak += 1
-                check_date = date_obj - timedelta(days=1)
-            else:
-                break
-    
-    # 今日の学習を記録
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    if today_str not in study_dates:
-        study_dates.append(today_str)
-        progress["study_dates"] = study_dates
-        save_progress(current_user.email, progress)
+    # 学習ストリーク（連続学習日数）: 学習日の記録時に更新済みの値を読むだけ
+    streak = current_streak(progress.get("streak", {}), datetime.now().date())
     
     # 最近完了したレッスン（最新5件）
     recent_completed = []
@@ -381,6 +402,7 @@ def dashboard():
 
 
 @app.route('/code-examples')
+@conditional_page()
 def code_examples_page():
     """コード例検索"""
     query = request.args.get('q', '').strip()
@@ -389,20 +411,23 @@ def code_examples_page():
     if query:
         examples = search_code_examples(query)
     elif category:
-        examples = [e for e in code_examples if e.get('category') == category]
+        examples = get_code_examples_by_category(category)
     else:
         examples = code_examples
     
-    # カテゴリ一覧を取得
-    categories = list(set(e.get('category', '') for e in code_examples if e.get('category')))
-    
     return render_template('code_examples.html',
                          examples=examples,
                          all_examples=code_examples,
-                         all_lessons=lessons,
+                         related_lessons=related_lessons_map,
                          query=query,
                          selected_category=category,
-                         categories=categories)
+                         categories=code_example_categories)
+
+
+@app.route('/static/dist/<path:filename>')
+def static_dist(filename):
+    """ハッシュ入りの静的ファイル（長期キャッシュ・gzip事前圧縮）"""
+    return send_asset(filename)
 
 
 @app.errorhandler(404)
@@ -418,25 +443,16 @@ def api_progress_toggle():
     kind = payload.get("kind")  # "lesson" | "project" | "task"
     if not item_id or kind not in ("lesson", "project", "task"):
         return jsonify({"ok": False, "error": "invalid_parameters"}), 400
-    progress = load_progress(current_user.email)
-    if kind == "lesson":
-        key = "lessons"
-    elif kind == "project":
-        key = "projects"
-    else:
-        key = "tasks"
-    current = bool(progress.get(key, {}).get(item_id))
-    progress.setdefault(key, {})[item_id] = not current
-    
-    # 学習日を記録
     today_str = datetime.now().strftime("%Y-%m-%d")
-    study_dates = progress.get("study_dates", [])
-    if today_str not in study_dates:
-        study_dates.append(today_str)
-    progress["study_dates"] = study_dates
-    
-    save_progress(current_user.email, progress)
-    return jsonify({"ok": True, "completed": not current})
+
+    def toggle(editor):
+        completed = editor.toggle_item(kind, item_id)
+        # 学習日を記録
+        editor.add_study_date(today_str)
+        return completed
+
+    completed = update_progress(current_user.email, toggle)
+    return jsonify({"ok": True, "completed": completed})
 
 
 @app.route('/api/favorites/toggle', methods=['POST'])
@@ -449,19 +465,9 @@ def api_favorites_toggle():
     if not item_id or kind not in ("lesson", "project"):
         return jsonify({"ok": False, "error": "invalid_parameters"}), 400
     
-    progress = load_progress(current_user.email)
-    favorites = progress.get("favorites", [])
     favorite_key = f"{kind}:{item_id}"
-    
-    if favorite_key in favorites:
-        favorites.remove(favorite_key)
-        is_favorite = False
-    else:
-        favorites.append(favorite_key)
-        is_favorite = True
-    
-    progress["favorites"] = favorites
-    save_progress(current_user.email, progress)
+    is_favorite = update_progress(
+        current_user.email, lambda editor: editor.toggle_favorite(favorite_key))
     return jsonify({"ok": True, "is_favorite": is_favorite})
 
 
@@ -477,21 +483,96 @@ def api_notes_save():
     if not item_id or kind not in ("lesson", "project"):
         return jsonify({"ok": False, "error": "invalid_parameters"}), 400
     
-    progress = load_progress(current_user.email)
-    notes = progress.get("notes", {})
+    # 空の場合は削除
     note_key = f"{kind}:{item_id}"
-    
-    if note:
-        notes[note_key] = note
-    else:
-        # 空の場合は削除
-        notes.pop(note_key, None)
-    
-    progress["notes"] = notes
-    save_progress(current_user.email, progress)
+    update_progress(current_user.email, lambda editor: editor.set_note(note_key, note))
     return jsonify({"ok": True})
 
 
+# バッチAPIで1リクエストに含められる操作の上限
+BATCH_MAX_OPS = 100
+
+
+def apply_progress_op(editor, op) -> dict:
+    """バッチAPIの操作1件を適用して結果を返す"""
+    if not isinstance(op, dict):
+        return {"ok": False, "error": "invalid_parameters"}
+    name = op.get("op")
+    item_id = op.get("item_id")
+    kind = op.get("kind")
+    if not isinstance(item_id, str) or not item_id:
+        return {"ok": False, "error": "invalid_parameters"}
+    if name == "toggle_progress" and kind in ("lesson", "project", "task"):
+        return {"ok": True, "completed": editor.toggle_item(kind, item_id)}
+    if name == "toggle_favorite" and kind in ("lesson", "project"):
+        return {"ok": True, "is_favorite": editor.toggle_favorite(f"{kind}:{item_id}")}
+    if name == "save_note" and kind in ("lesson", "project"):
+        note = op.get("note")
+        if note is not None and not isinstance(note, str):
+            return {"ok": False, "error": "invalid_parameters"}
+        # 空（またはnull）の場合は削除
+        editor.set_note(f"{kind}:{item_id}", (note or "").strip())
+        return {"ok": True}
+    return {"ok": False, "error": "invalid_parameters"}
+
+
+@app.route('/api/progress/batch', methods=['POST'])
+@login_required
+def api_progress_batch():
+    """進捗・お気に入り・ノートの更新をまとめて適用（1回の読み込み・保存）"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"ok": False, "error": "invalid_parameters"}), 400
+    ops = payload.get("ops")
+    if not isinstance(ops, list) or not ops or len(ops) > BATCH_MAX_OPS:
+        return jsonify({"ok": False, "error": "invalid_parameters"}), 400
+    today_str = datetime.now().strftime("%Y-%m-%d")
+
+    def apply_all(editor):
+        results = [apply_progress_op(editor, op) for op in ops]
+        # 学習日を記録
+        if any(r["ok"] and "completed" in r for r in results):
+            editor.add_study_date(today_str)
+        return results
+
+    results = update_progress(current_user.email, apply_all)
+    return jsonify({"ok": True, "results": results})
+
+
+# /api/me/state で一度に問い合わせられる項目数の上限
+ME_STATE_MAX_ITEMS = 200
+
+
+@app.route('/api/me/state')
+def api_me_state():
+    """共通HTMLのページに反映するログインユーザーの状態
+
+    items=lesson:python-01,task:task-fetch-api のように "種類:ID" をカンマ区切りで渡す。
+    """
+    if not current_user.is_authenticated:
+        response = jsonify({"authenticated": False})
+    else:
+        progress = load_progress(current_user.email)
+        favorites = set(progress.get("favorites", []))
+        notes = progress.get("notes", {})
+        keys = [k for k in request.args.get("items", "").split(",") if k][:ME_STATE_MAX_ITEMS]
+        items = {}
+        for key in keys:
+            kind, _, item_id = key.partition(":")
+            if kind not in KIND_KEYS or not item_id:
+                continue
+            items[key] = {
+                "completed": bool(progress.get(KIND_KEYS[kind], {}).get(item_id)),
+                "favorite": key in favorites,
+                "note": notes.get(key, ""),
+            }
+        response = jsonify({"authenticated": True, "name": current_user.name, "items": items})
+    # ユーザーごとの内容なので共有キャッシュには載せない
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
+
 @app.route('/search')
 def search_page():
     """検索ページ（レッスン・プロジェクト）"""
@@ -504,26 +585,13 @@ def search_page():
     }
     
     if query:
-        query_lower = query.lower()
-        
-        # レッスンを検索
-        if not category or category == "lessons":
-            for lesson in lessons:
-                title_match = query_lower in lesson.get("title", "").lower()
-                desc_match = query_lower in lesson.get("description", "").lower() if lesson.get("description") else False
-                category_match = query_lower in lesson.get("category", "").lower()
-                
-                if title_match or desc_match or category_match:
-                    results["lessons"].append(lesson)
-        
-        # プロジェクトを検索
-        if not category or category == "projects":
-            for project in projects:
-                title_match = query_lower in project.get("title", "").lower()
-                desc_match = query_lower in project.get("description", "").lower() if project.get("description") else False
-                
-                if title_match or desc_match:
-                    results["projects"].append(project)
+        # タイトル・説明・本文の転置インデックスで検索（スコア順）
+        hits = get_search_index().search(query)
+        for hit in hits:
+            if hit.kind == "lesson" and category in ("", "lessons"):
+                results["lessons"].append(hit)
+            elif hit.kind == "project" and category in ("", "projects"):
+                results["projects"].append(hit)
     
     return render_template('search.html',
                          query=query,
@@ -565,9 +633,10 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email', '').strip().lower()
         password = request.form.get('password', '')
-        record = DATA_USERS.get(email)
-        if record and record['password'] == password:
-            user = User(email=email, name=record.get("name", email))
+        record = get_user_store().authenticate(email, password)
+        if record:
+            user = User(email=record["email"], name=record["name"])
+            user_cache.put(user.id, user)
             login_user(user)
             flash('ログインしました。', 'success')
             next_url = request.args.get('next') or url_for('index')
@@ -583,6 +652,38 @@ def logout():
     return redirect(url_for('index'))
 
 
+def warm_up() -> dict:
+    """プロセス内のキャッシュをあらかじめ作る（gunicorn.conf.py からフォーク前に呼ぶ）
+
+    検索インデックス・テンプレート・変換済みHTML・描画済みページを用意しておき、
+    ワーカーは最初のリクエストから温まった状態で、そのメモリを共有して動く。
+    """
+    get_search_index()
+    get_assets()
+    site_version()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    rendered = sum(1 for item in [*lessons, *projects] if render_lesson_html(item["id"]) is not None)
+
+    # 全員共通のページを描画してページキャッシュに入れる
+    with app.test_request_context():
+        urls = [url_for('lessons_list'), url_for('projects_list'),
+                url_for('code_examples_page'), url_for('common_mistakes_page')]
+        urls += [url_for('lesson_detail', lesson_id=lesson["id"]) for lesson in lessons]
+        urls += [url_for('project_detail', project_id=project["id"]) for project in projects]
+    client = app.test_client()
+    for url in urls:
+        # ストリーミングのページは最後まで読むとキャッシュに入る
+        client.get(url, buffered=True)
+    # ウォームアップのリクエストはワーカーの /metrics に含めない（gc.freeze の前に捨てる）
+    metrics.reset()
+    return {"templates": len(app.jinja_env.list_templates()), "markdown": rendered,
+            "pages": page_cache.stats()["size"]}
+
+
 if __name__ == '__main__':
+    # WATCH_LESSONS=1 なら lessons/*.md の変更を再起動せずに反映する
+    if WATCH_LESSONS:
+        start_watcher()
     app.run(debug=True, host='127.0.0.1', port=8000)
 
@@ -0,0 +1,90 @@
+"""静的ファイル（CSS / JS）のフィンガープリント付きURLと配信
+
+python -m build_assets で static/dist/ に内容のハッシュ入りのファイル名で
+縮小版と .gz を出力しておくと、url_for('static', filename='css/style.css') が
+/static/dist/css/style.<hash>.css を返すようになる。
+ファイル名が内容ごとに変わるので、1年間・immutable でキャッシュさせる。
+ビルドしていない、または元ファイルが変わった項目は通常の /static/ のまま配信する。
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+from flask import request, send_from_directory
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+# static/ の下の出力先（URLは /static/dist/...）
+ASSET_DIST_NAME = "dist"
+ASSET_DIST_DIR = os.path.join(STATIC_DIR, ASSET_DIST_NAME)
+ASSET_MANIFEST_NAME = "manifest.json"
+# フィンガープリント付きファイルのキャッシュ期間（1年）
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+_assets = None
+_assets_lock = threading.Lock()
+
+
+def asset_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def load_assets(dist_dir: str = ASSET_DIST_DIR) -> dict:
+    """マニフェストを読み込み、元ファイル名 -> 出力ファイル名 を返す
+
+    元ファイルの内容がビルド時から変わっている項目は含めない。
+    """
+    try:
+        with open(os.path.join(dist_dir, ASSET_MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    assets = {}
+    for name, item in manifest.get("items", {}).items():
+        try:
+            with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+                current = asset_hash(f.read())
+        except OSError:
+            continue
+        if current == item.get("source_hash"):
+            assets[name] = item["path"]
+    return assets
+
+
+def get_assets() -> dict:
+    """プロセスごとに一度だけマニフェストを読み込む"""
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                _assets = load_assets()
+    return _assets
+
+
+def fingerprint_static_url(endpoint: str, values: dict):
+    """app.url_defaults 用: ビルド済みの静的ファイルはハッシュ入りのファイル名にする"""
+    if endpoint != "static":
+        return
+    path = get_assets().get(values.get("filename"))
+    if path:
+        values["filename"] = f"{ASSET_DIST_NAME}/{path}"
+
+
+def send_asset(filename: str):
+    """ビルド済みファイルを長期キャッシュ付きで返す（gzip対応のクライアントには .gz）"""
+    mimetype = mimetypes.guess_type(filename)[0]
+    gzipped = ("gzip" in request.accept_encodings
+               and os.path.isfile(os.path.join(ASSET_DIST_DIR, f"{filename}.gz")))
+    if gzipped:
+        response = send_from_directory(ASSET_DIST_DIR, f"{filename}.gz",
+                                       mimetype=mimetype, max_age=ASSET_MAX_AGE)
+        response.content_encoding = "gzip"
+    else:
+        response = send_from_directory(ASSET_DIST_DIR, filename,
+                                       mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+    return response
@@ -0,0 +1,109 @@
+"""静的ファイルを縮小・フィンガープリント付けするビルドコマンド
+
+使い方:
+    python -m build_assets [--out static/dist]
+
+static/css/*.css と static/js/*.js を縮小し、内容のハッシュ入りのファイル名
+（css/style.<hash>.css）と gzip 圧縮版（.gz）を出力する。
+最後にマニフェストを書き換えて、アプリが新しいファイル名を使うようにする。
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+from assets import ASSET_DIST_DIR, ASSET_MANIFEST_NAME, STATIC_DIR, asset_hash
+from build_content import write_atomic
+
+# 対象のファイル（static/ からの相対パス）
+ASSET_PATTERNS = ["css/*.css", "js/*.js"]
+
+
+def minify_css(text: str) -> str:
+    """コメントと余分な空白を取り除く"""
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    # 宣言の "color: red" のコロン後の空白（セレクタの " :hover" は残す）
+    text = re.sub(r":\s+", ":", text)
+    text = text.replace(";}", "}")
+    return text.strip()
+
+
+def minify_js(text: str) -> str:
+    """行コメント・インデント・空行を取り除く（改行は自動セミコロン挿入のため残す）"""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("//"):
+            continue
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def list_assets(static_dir: str = STATIC_DIR) -> list:
+    """ビルド対象の static/ からの相対パス"""
+    names = []
+    for pattern in ASSET_PATTERNS:
+        for path in sorted(glob.glob(os.path.join(static_dir, pattern))):
+            names.append(os.path.relpath(path, static_dir).replace(os.sep, "/"))
+    return names
+
+
+def build_asset(name: str, out_dir: str) -> dict:
+    """1ファイルを縮小して出力し、マニフェストの項目を返す"""
+    with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+        data = f.read()
+    root, ext = os.path.splitext(name)
+    minified = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+    path = f"{root}.{asset_hash(minified)[:12]}{ext}"
+    out_path = os.path.join(out_dir, path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(minified)
+    # mtime=0 にして同じ内容なら同じ .gz になるようにする
+    compressed = gzip.compress(minified, compresslevel=9, mtime=0)
+    with open(f"{out_path}.gz", 'wb') as f:
+        f.write(compressed)
+    return {
+        "path": path,
+        "source_hash": asset_hash(data),
+        "bytes": len(data),
+        "minified_bytes": len(minified),
+        "gzip_bytes": len(compressed),
+    }
+
+
+def build(out_dir: str = ASSET_DIST_DIR) -> dict:
+    """すべての静的ファイルをビルドしてマニフェストを出力する"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "items": {name: build_asset(name, out_dir) for name in list_assets()},
+    }
+    # マニフェストは最後に書き換え、出力途中のファイル名を参照させない
+    write_atomic(os.path.join(out_dir, ASSET_MANIFEST_NAME), json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="静的ファイルを縮小・フィンガープリント付けする")
+    parser.add_argument("--out", default=ASSET_DIST_DIR, help="出力先ディレクトリ")
+    args = parser.parse_args(argv)
+
+    manifest = build(out_dir=args.out)
+    for name, item in manifest["items"].items():
+        print(f"{name} -> {item['path']} "
+              f"({item['bytes']:,} -> {item['minified_bytes']:,} bytes, gzip {item['gzip_bytes']:,} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""レッスンMarkdownを事前にHTMLへ変換するビルドコマンド
+
+使い方:
+    python -m build_content [--jobs N] [--out build/content]
+
+lessons/*.md をプロセスプールで並列に変換し、
+build/content/<バージョン>/ にHTMLとマニフェストを出力する。
+最後に build/content/CURRENT を新しいバージョンに書き換える。
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from content import (
+    CONTENT_BUILD_DIR, CURRENT_NAME, LESSONS_DIR, MANIFEST_NAME, render_markdown, render_settings,
+    source_hash,
+)
+
+
+def list_sources(lessons_dir: str = LESSONS_DIR) -> list:
+    """変換対象のMarkdown（_で始まるテンプレートは除く）"""
+    paths = sorted(glob.glob(os.path.join(lessons_dir, "*.md")))
+    return [p for p in paths if not os.path.basename(p).startswith("_")]
+
+
+def render_source(path: str) -> dict:
+    """1ファイルを変換してマニフェストの項目を返す（ワーカープロセスで実行）"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    html = render_markdown(data.decode('utf-8'))
+    return {
+        "id": os.path.splitext(os.path.basename(path))[0],
+        "source_hash": source_hash(data),
+        "html": html,
+        "bytes": len(html.encode('utf-8')),
+    }
+
+
+def build_version(items: list) -> str:
+    """ソースと変換設定からビルドのバージョン文字列を作る"""
+    h = hashlib.sha256()
+    h.update(json.dumps(render_settings(), sort_keys=True).encode())
+    for item in items:
+        h.update(f"{item['id']}:{item['source_hash']}".encode())
+    return h.hexdigest()[:12]
+
+
+def write_atomic(path: str, text: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def build(out_dir: str = CONTENT_BUILD_DIR, jobs: int | None = None) -> dict:
+    """すべてのレッスンを変換してマニフェストを出力する"""
+    sources = list_sources()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        items = list(pool.map(render_source, sources))
+
+    version = build_version(items)
+    version_dir = os.path.join(out_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+    for item in items:
+        write_atomic(os.path.join(version_dir, f"{item['id']}.html"), item["html"])
+
+    manifest = {
+        "version": version,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        **render_settings(),
+        "items": {item["id"]: item for item in items},
+    }
+    write_atomic(os.path.join(version_dir, MANIFEST_NAME),
+                 json.dumps(manifest, ensure_ascii=False))
+    # CURRENTの書き換えは最後に行い、途中のビルドを読ませない
+    write_atomic(os.path.join(out_dir, CURRENT_NAME), version)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="レッスンMarkdownをHTMLに事前変換する")
+    parser.add_argument("--out", default=CONTENT_BUILD_DIR, help="出力先ディレクトリ")
+    parser.add_argument("--jobs", type=int, default=None, help="並列プロセス数")
+    args = parser.parse_args(argv)
+
+    manifest = build(out_dir=args.out, jobs=args.jobs)
+    total = sum(item["bytes"] for item in manifest["items"].values())
+    print(f"{len(manifest['items'])}件のレッスンを変換しました "
+          f"(version={manifest['version']}, {total:,} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""レスポンスのgzip圧縮
+
+Accept-Encoding に gzip を含むクライアントへ、一定サイズ以上のテキストを圧縮して返す。
+描画済みページの圧縮結果は http_cache.page_cache が保持するので、
+同じページを毎回圧縮し直すことはない。
+ストリーミングのレスポンスは、届いた部分から順に圧縮して送る。
+"""
+import gzip
+import os
+import zlib
+
+from flask import request
+
+# これより小さい本文は圧縮しない（ヘッダーの分だけ得をしない）
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))
+COMPRESS_MIMETYPES = {
+    "text/html", "text/css", "text/plain", "text/javascript",
+    "application/javascript", "application/json",
+}
+
+
+def gzip_bytes(data: bytes) -> bytes:
+    # mtime=0 にして同じ本文なら同じ圧縮結果にする
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def accepts_gzip() -> bool:
+    return "gzip" in request.accept_encodings
+
+
+def gzip_stream(chunks):
+    """本文の断片を順に圧縮して返す（断片ごとにフラッシュして、届いた分から表示させる）"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def should_compress(response) -> bool:
+    if response.status_code != 200 or response.direct_passthrough:
+        return False
+    if "Content-Encoding" in response.headers or response.mimetype not in COMPRESS_MIMETYPES:
+        return False
+    # ストリーミングは長さが分からないので、圧縮する対象とみなす
+    return response.is_streamed or (response.content_length or 0) >= COMPRESS_MIN_SIZE
+
+
+def mark_gzip(response):
+    response.content_encoding = "gzip"
+    response.vary.add("Accept-Encoding")
+    # 圧縮前と別の表現になるので弱いETagにする（If-None-Match は弱い比較で一致する）
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def set_gzip_body(response, compressed: bytes):
+    """圧縮済みの本文をレスポンスに設定する"""
+    response.set_data(compressed)
+    return mark_gzip(response)
+
+
+def compress_response(response):
+    """app.after_request 用: 圧縮できるレスポンスをgzipにする"""
+    if not should_compress(response):
+        return response
+    response.vary.add("Accept-Encoding")
+    if not accepts_gzip():
+        return response
+    if response.is_streamed:
+        response.response = gzip_stream(response.response)
+        response.headers.pop("Content-Length", None)
+        return mark_gzip(response)
+    return set_gzip_body(response, gzip_bytes(response.get_data()))
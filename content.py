@@ -0,0 +1,237 @@
+"""レッスンMarkdownの読み込みとHTML変換"""
+import hashlib
+import json
+import os
+import re
+import threading
+from html import unescape
+
+from highlight import highlight_html, highlight_settings
+from lru import LRUCache
+from metrics import timed
+
+LESSONS_DIR = "lessons"
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite']
+# codehilite は言語名を付けるだけにし、ハイライトは highlight.py のキャッシュを通して行う
+MARKDOWN_EXTENSION_CONFIGS = {'codehilite': {'use_pygments': False}}
+RENDER_CACHE_SIZE = int(os.environ.get("RENDER_CACHE_SIZE", "128"))
+# build_content.py が出力する事前変換済みHTMLの置き場所
+CONTENT_BUILD_DIR = os.environ.get("CONTENT_BUILD_DIR", os.path.join("build", "content"))
+MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "CURRENT"
+# 変換後のHTMLをこの見出しの直前で区切る
+SECTION_HEADING_RE = re.compile(r"(?=<h2[\s>])")
+SECTION_TITLE_RE = re.compile(r"<h2[^>]*>(.*?)</h2>", re.S)
+
+
+def markdown_path(item_id: str) -> str:
+    """レッスン・プロジェクトIDからMarkdownファイルのパスを返す"""
+    return os.path.join(LESSONS_DIR, f"{item_id}.md")
+
+
+def render_markdown(text: str) -> str:
+    """MarkdownをHTMLに変換（コードブロックはハイライトする）"""
+    # markdownは起動を速くするため最初の変換時に読み込む
+    import markdown
+    with timed("markdown"):
+        html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS,
+                                 extension_configs=MARKDOWN_EXTENSION_CONFIGS)
+    return highlight_html(html)
+
+
+def source_hash(data: bytes) -> str:
+    """Markdownソースのハッシュ値"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class RenderCache(LRUCache):
+    """変換済みHTMLのキャッシュ（path -> (stat_key, digest, html)）
+
+    ファイルのmtimeとサイズが変わっていなければそのまま返し、
+    変わっていてもソースのハッシュが同じなら再変換しない。
+    """
+
+    def render(self, path: str) -> str | None:
+        """pathのMarkdownを変換したHTMLを返す（ファイルがなければNone）"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.pop(path)
+            return None
+        stat_key = (st.st_mtime_ns, st.st_size)
+
+        entry = self.lookup(path)
+        if entry and entry[0] == stat_key:
+            self.record(True)
+            return entry[2]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = source_hash(data)
+
+        if entry and entry[1] == digest:
+            # 更新日時だけが変わった場合は再変換しない
+            self.put(path, (stat_key, digest, entry[2]))
+            self.record(True)
+            return entry[2]
+        self.record(False)
+
+        html = render_markdown(data.decode('utf-8'))
+        self.put(path, (stat_key, digest, html))
+        return html
+
+
+render_cache = RenderCache(maxsize=RENDER_CACHE_SIZE)
+
+_source_versions = {}  # path -> (stat_key, digest)
+
+
+def source_version(item_id: str) -> tuple | None:
+    """Markdownソースの (ハッシュ, 更新日時のUNIX時刻) を返す（ファイルがなければNone）
+
+    ファイルのmtimeとサイズが変わらない限りハッシュは計算し直さない。
+    """
+    path = markdown_path(item_id)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stat_key = (st.st_mtime_ns, st.st_size)
+    cached = _source_versions.get(path)
+    if cached and cached[0] == stat_key:
+        return cached[1], st.st_mtime
+    with open(path, 'rb') as f:
+        digest = source_hash(f.read())
+    _source_versions[path] = (stat_key, digest)
+    return digest, st.st_mtime
+
+
+def render_settings() -> dict:
+    """HTMLの変換結果に影響する設定（マニフェストに同じキーで記録する）"""
+    import markdown
+    return {
+        "markdown_version": markdown.__version__,
+        "extensions": MARKDOWN_EXTENSIONS,
+        "extension_configs": MARKDOWN_EXTENSION_CONFIGS,
+        "highlight": highlight_settings(),
+    }
+
+
+def current_build_version(build_dir: str = CONTENT_BUILD_DIR) -> str:
+    """現在の事前変換ビルドのバージョン（ビルドがなければ空文字）"""
+    try:
+        with open(os.path.join(build_dir, CURRENT_NAME), 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def built_with_current_settings(manifest: dict) -> bool:
+    """マニフェストの変換設定（render_settings のキー）が今の設定と同じか"""
+    current = render_settings()
+    built = {key: manifest.get(key) for key in current}
+    return json.dumps(built, sort_keys=True) == json.dumps(current, sort_keys=True)
+
+
+def read_manifest(build_dir: str = CONTENT_BUILD_DIR) -> dict | None:
+    """現在のビルドのマニフェストを読み込む（ビルドがなければNone）"""
+    try:
+        with open(os.path.join(build_dir, CURRENT_NAME), 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+        with open(os.path.join(build_dir, version, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_prerendered(build_dir: str = CONTENT_BUILD_DIR) -> dict:
+    """ソースと一致する事前変換済みHTMLを id -> (ソースのハッシュ, html) の辞書で返す
+
+    ビルド後にMarkdownが編集されたものは含めない（ライブ変換に任せる）。
+    Markdown・Pygmentsのバージョンや変換設定が今と違うビルドは使わない。
+    """
+    manifest = read_manifest(build_dir)
+    if not manifest or not built_with_current_settings(manifest):
+        return {}
+    prerendered = {}
+    for item_id, entry in manifest.get("items", {}).items():
+        version = source_version(item_id)
+        if version and version[0] == entry.get("source_hash"):
+            prerendered[item_id] = (version[0], entry["html"])
+    return prerendered
+
+
+_prerendered = None
+_prerendered_lock = threading.Lock()
+
+
+def get_prerendered() -> dict:
+    """事前変換済みHTML（プロセスごとに一度だけ読み込む）"""
+    global _prerendered
+    if _prerendered is None:
+        with _prerendered_lock:
+            if _prerendered is None:
+                _prerendered = load_prerendered()
+    return _prerendered
+
+
+def render_lesson_html(item_id: str) -> str | None:
+    """レッスン・プロジェクトのMarkdownをHTMLで返す（ファイルがなければNone）
+
+    ビルド済みのHTMLがソースと一致していればそれを使い、なければその場で変換する。
+    起動後に編集されたものも、ソースのハッシュ（statが変わらない限り再計算しない）で検知する。
+    """
+    entry = get_prerendered().get(item_id)
+    if entry is not None:
+        version = source_version(item_id)
+        if version and version[0] == entry[0]:
+            return entry[1]
+    return render_cache.render(markdown_path(item_id))
+
+
+def split_sections(html: str) -> list:
+    """変換後のHTMLを <h2> の直前で区切る（最初の見出しより前の部分も1つ目の要素になる）"""
+    return [part for part in SECTION_HEADING_RE.split(html) if part]
+
+
+def section_title(html: str) -> str:
+    """節の先頭の <h2> の文字列（見出しのない節は空文字）"""
+    match = SECTION_TITLE_RE.match(html)
+    if not match:
+        return ""
+    return unescape(re.sub(r"<[^>]+>", "", match.group(1))).strip()
+
+
+_sections = {}  # item_id -> (変換後のHTML, 節のリスト)
+_sections_lock = threading.Lock()
+
+
+def lesson_sections(item_id: str) -> list | None:
+    """レッスンを <h2> ごとに区切った節のリスト（ファイルがなければNone）
+
+    各要素は {"index", "title", "html"}。変換後のHTMLが変わらない限り区切り直さない。
+    """
+    html = render_lesson_html(item_id)
+    if html is None:
+        return None
+    cached = _sections.get(item_id)
+    if cached and cached[0] is html:
+        return cached[1]
+    sections = [{"index": i, "title": section_title(part), "html": part}
+                for i, part in enumerate(split_sections(html))]
+    with _sections_lock:
+        _sections[item_id] = (html, sections)
+    return sections
+
+
+def invalidate_item(item_id: str):
+    """1件分の変換済みHTML・ソースのハッシュ・節を破棄する（Markdownが変更されたとき）
+
+    事前変換済みHTMLも破棄するので、以降はその場で変換した結果を使う。
+    """
+    path = markdown_path(item_id)
+    get_prerendered().pop(item_id, None)
+    render_cache.pop(path)
+    _source_versions.pop(path, None)
+    with _sections_lock:
+        _sections.pop(item_id, None)
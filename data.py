@@ -89,40 +89,86 @@ roadmap_phases = [
 ]
 
 
+# ===== 索引 =====
+
+class Catalog:
+    """レッスン・プロジェクトの索引（インポート時に一度だけ構築）"""
+
+    def __init__(self, lessons: list, projects: list, phases: list):
+        self.lessons_by_id = {lesson["id"]: lesson for lesson in lessons}
+        self.projects_by_id = {project["id"]: project for project in projects}
+        self.phases_by_name = {phase["name"]: phase for phase in phases}
+
+        by_phase = {}
+        by_category = {}
+        by_level = {}
+        for lesson in lessons:
+            by_phase.setdefault(lesson.get("phase"), []).append(lesson)
+            by_category.setdefault(lesson.get("category"), []).append(lesson)
+            by_level.setdefault(lesson.get("level"), []).append(lesson)
+        self.lessons_by_phase = {k: tuple(v) for k, v in by_phase.items()}
+        self.lessons_by_category = {k: tuple(v) for k, v in by_category.items()}
+        self.lessons_by_level = {k: tuple(v) for k, v in by_level.items()}
+
+        # 前後ナビ（レッスンは同じフェーズ内、プロジェクトは配列順）
+        self.lesson_neighbors = {}
+        for phase_lessons in self.lessons_by_phase.values():
+            self.lesson_neighbors.update(self._neighbors(phase_lessons))
+        self.project_neighbors = self._neighbors(tuple(projects))
+
+    @staticmethod
+    def _neighbors(items: tuple) -> dict:
+        neighbors = {}
+        for i, item in enumerate(items):
+            prev_item = items[i - 1] if i > 0 else None
+            next_item = items[i + 1] if i < len(items) - 1 else None
+            neighbors[item["id"]] = (prev_item, next_item)
+        return neighbors
+
+
+catalog = Catalog(lessons, projects, roadmap_phases)
+
+
 # ===== データ検索・フィルタリング関数 =====
 
 def get_lesson_by_id(lesson_id: str) -> dict | None:
     """レッスンIDでレッスンを取得"""
-    for lesson in lessons:
-        if lesson["id"] == lesson_id:
-            return lesson
-    return None
+    return catalog.lessons_by_id.get(lesson_id)
+
+
+def get_lessons_by_phase(phase: int) -> tuple:
+    """フェーズ番号でレッスンを取得（data.lessonsの並び順）"""
+    return catalog.lessons_by_phase.get(phase, ())
 
 
 def get_lessons_by_category(category: str) -> list:
     """カテゴリでレッスンをフィルタリング"""
-    return [lesson for lesson in lessons if lesson.get("category") == category]
+    return list(catalog.lessons_by_category.get(category, ()))
 
 
 def get_lessons_by_level(level: str) -> list:
     """レベルでレッスンをフィルタリング"""
-    return [lesson for lesson in lessons if lesson.get("level") == level]
+    return list(catalog.lessons_by_level.get(level, ()))
+
+
+def get_lesson_neighbors(lesson_id: str) -> tuple:
+    """同じフェーズ内の前後のレッスンを (prev, next) で取得"""
+    return catalog.lesson_neighbors.get(lesson_id, (None, None))
 
 
 def get_project_by_id(project_id: str) -> dict | None:
     """プロジェクトIDでプロジェクトを取得"""
-    for project in projects:
-        if project["id"] == project_id:
-            return project
-    return None
+    return catalog.projects_by_id.get(project_id)
+
+
+def get_project_neighbors(project_id: str) -> tuple:
+    """前後のプロジェクトを (prev, next) で取得"""
+    return catalog.project_neighbors.get(project_id, (None, None))
 
 
 def get_phase_by_name(phase_name: str) -> dict | None:
     """フェーズ名でフェーズを取得"""
-    for phase in roadmap_phases:
-        if phase["name"] == phase_name:
-            return phase
-    return None
+    return catalog.phases_by_name.get(phase_name)
 
 
 # ===== 表示関数 =====
@@ -361,26 +407,71 @@ code_examples = [
 ]
 
 
+# ===== サポートデータの索引（インポート時に一度だけ構築） =====
+
+def _code_example_search_key(example: dict) -> str:
+    """タイトル・説明・キーワードを小文字にして連結した検索用の文字列"""
+    parts = [example.get("title", ""), example.get("description", "")]
+    parts.extend(example.get("keywords", []))
+    return "\n".join(parts).lower()
+
+
+_code_example_search_keys = [(_code_example_search_key(e), e) for e in code_examples]
+
+_common_mistakes_by_category = {}
+for _mistake in common_mistakes:
+    _common_mistakes_by_category.setdefault(_mistake.get("category"), []).append(_mistake)
+
+_code_examples_by_category = {}
+for _example in code_examples:
+    _code_examples_by_category.setdefault(_example.get("category"), []).append(_example)
+
+code_example_categories = sorted(c for c in _code_examples_by_category if c)
+
+# コード例・つまずきポイントID -> 関連レッスン（存在するものだけ）
+related_lessons_map = {}
+# レッスンID -> そのレッスンを参照しているコード例・つまずきポイント
+_code_examples_by_lesson = {}
+_common_mistakes_by_lesson = {}
+for _items, _reverse in ((code_examples, _code_examples_by_lesson),
+                         (common_mistakes, _common_mistakes_by_lesson)):
+    for _item in _items:
+        _related = [catalog.lessons_by_id[lid] for lid in _item.get("related_lessons", [])
+                    if lid in catalog.lessons_by_id]
+        related_lessons_map[_item["id"]] = tuple(_related)
+        for _lesson in _related:
+            _reverse.setdefault(_lesson["id"], []).append(_item)
+
+
 def get_common_mistakes_by_category(category: str = None) -> list:
     """カテゴリでつまずきポイントをフィルタリング"""
     if category:
-        return [m for m in common_mistakes if m.get("category") == category]
+        return list(_common_mistakes_by_category.get(category, ()))
     return common_mistakes
 
 
+def get_code_examples_by_category(category: str) -> list:
+    """カテゴリでコード例をフィルタリング"""
+    return list(_code_examples_by_category.get(category, ()))
+
+
+def get_code_examples_for_lesson(lesson_id: str) -> list:
+    """レッスンに関連するコード例を取得"""
+    return list(_code_examples_by_lesson.get(lesson_id, ()))
+
+
+def get_common_mistakes_for_lesson(lesson_id: str) -> list:
+    """レッスンに関連するつまずきポイントを取得"""
+    return list(_common_mistakes_by_lesson.get(lesson_id, ()))
+
+
 def search_code_examples(query: str) -> list:
     """キーワードでコード例を検索"""
     if not query:
         return code_examples
     query_lower = query.lower()
-    results = []
-    for example in code_examples:
-        # タイトル、キーワード、説明で検索
-        if (query_lower in example["title"].lower() or
-            query_lower in example["description"].lower() or
-            any(query_lower in kw.lower() for kw in example.get("keywords", []))):
-            results.append(example)
-    return results
+    # タイトル、キーワード、説明で検索
+    return [example for key, example in _code_example_search_keys if query_lower in key]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+"""SQLite（WALモード）への接続（進捗とユーザーの保存先で共通）"""
+import os
+import sqlite3
+import threading
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """WALモードで接続する（トランザクションは BEGIN / COMMIT で明示する）"""
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def create_schema(db_path: str, schema: str):
+    """その場限りの接続でテーブルを作る
+
+    import時（gunicornのマスター）に開いた接続をフォーク後のワーカーに持ち越さないため。
+    """
+    conn = connect(db_path)
+    try:
+        conn.executescript(schema)
+    finally:
+        conn.close()
+
+
+class LocalConnection:
+    """スレッドごと・プロセスごとの接続（fork後に親の接続を使わない）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = connect(self.db_path)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        """このスレッドの接続を閉じる（マスターで書き込んだあと、フォーク前に呼ぶ）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
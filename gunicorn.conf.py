@@ -0,0 +1,35 @@
+"""gunicornの設定（gunicorn app:app で自動的に読み込まれる）
+
+マスターでアプリを読み込み（preload_app）、フォーク前に warm_up() で
+検索インデックス・テンプレート・変換済みHTML・描画済みページを用意する。
+その後 gc.freeze() でそれらをGCの対象から外し、ワーカーがコピーオンライトで
+同じメモリを共有したまま使えるようにする。
+環境変数 PRELOAD_APP=0 でワーカーごとに読み込む従来の動作に戻せる。
+WATCH_LESSONS=1 のときは各ワーカーで lessons/*.md の監視（watcher.py）を始める。
+"""
+import gc
+import os
+import time
+
+preload_app = os.environ.get("PRELOAD_APP", "1") != "0"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app import warm_up
+
+    started = time.perf_counter()
+    summary = warm_up()
+    # 以降に作られるオブジェクトだけをGCの対象にし、参照カウント以外でページを書き換えない
+    gc.freeze()
+    server.log.info("warm up finished in %.2fs: %s (frozen objects: %d)",
+                    time.perf_counter() - started, summary, gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    # キャッシュはワーカーごとにあるので、監視スレッドもフォーク後にワーカーごとに起動する
+    from watcher import WATCH_LESSONS, start_watcher
+
+    if WATCH_LESSONS:
+        start_watcher()
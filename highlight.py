@@ -0,0 +1,96 @@
+"""コードのシンタックスハイライトとそのキャッシュ
+
+Pygmentsによるハイライトは (言語, コードのハッシュ) をキーにキャッシュし、
+同じコードは何度出てきても一度だけハイライトする。
+Markdownのコードブロック（codehilite は use_pygments=False で言語名だけ付ける）と、
+data.py のコード例を表示するテンプレートフィルタ highlight の両方から使う。
+
+色は static/css/highlight.css に書き出したものを使う:
+    python -m highlight > static/css/highlight.css
+"""
+import hashlib
+import os
+import re
+import sys
+from html import unescape
+
+from markupsafe import Markup
+
+from lru import LRUCache
+from metrics import timed
+
+HIGHLIGHT_CACHE_SIZE = int(os.environ.get("HIGHLIGHT_CACHE_SIZE", "4096"))
+# codehilite と同じクラス名にして、Markdownとテンプレートで同じCSSを使う
+HIGHLIGHT_CSS_CLASS = "codehilite"
+HIGHLIGHT_STYLE = "github-dark"
+# use_pygments=False の codehilite が出力するコードブロック
+CODE_BLOCK_RE = re.compile(
+    r'<pre(?: class="codehilite")?><code(?: class="language-([\w+#.-]+)")?>(.*?)</code></pre>', re.S)
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+def render_highlight(code: str, lang: str | None) -> str:
+    """Pygmentsでハイライトする（言語が分からなければ色を付けずに同じ形のHTMLにする）"""
+    # Pygmentsは起動を速くするため最初のハイライト時に読み込む
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import TextLexer, get_lexer_by_name
+    from pygments.util import ClassNotFound
+
+    try:
+        lexer = get_lexer_by_name(lang) if lang else TextLexer()
+    except ClassNotFound:
+        lexer = TextLexer()
+    formatter = HtmlFormatter(cssclass=HIGHLIGHT_CSS_CLASS, wrapcode=True)
+    with timed("highlight"):
+        return highlight(code, lexer, formatter)
+
+
+# ハイライト済みHTMLのキャッシュ: (言語, コードのハッシュ) -> html
+highlight_cache = LRUCache(maxsize=HIGHLIGHT_CACHE_SIZE)
+
+
+def highlight_code(code: str, lang: str | None = None) -> str:
+    """コードをハイライトしたHTML（キャッシュ済みならそれを返す）"""
+    key = (lang or "", code_hash(code))
+    html = highlight_cache.get(key)
+    if html is None:
+        html = render_highlight(code, lang)
+        highlight_cache.put(key, html)
+    return html
+
+
+def highlight_html(html: str) -> str:
+    """Markdownを変換したHTMLのコードブロックをハイライトしたものに置き換える"""
+    def replace(match):
+        return highlight_code(unescape(match.group(2)), match.group(1))
+    return CODE_BLOCK_RE.sub(replace, html)
+
+
+def highlight_filter(code, lang: str | None = None) -> Markup:
+    """テンプレート用: {{ example.code|highlight('python') }}"""
+    return Markup(highlight_code(str(code), lang))
+
+
+def highlight_settings() -> str:
+    """ハイライト結果に影響する設定（事前変換のバージョンに含める）"""
+    import pygments
+    return f"pygments={pygments.__version__},cssclass={HIGHLIGHT_CSS_CLASS}"
+
+
+def style_defs() -> str:
+    """static/css/highlight.css の内容（背景色などは既存の pre のものを使う）"""
+    from pygments.formatters import HtmlFormatter
+
+    defs = HtmlFormatter(style=HIGHLIGHT_STYLE).get_style_defs(f".{HIGHLIGHT_CSS_CLASS}")
+    # トークンごとの色だけを使う（pre全体や行番号のスタイルは含めない）
+    lines = [line for line in defs.splitlines() if line.startswith(f".{HIGHLIGHT_CSS_CLASS} .")]
+    header = f"/* Pygments（{HIGHLIGHT_STYLE}）の配色。python -m highlight で生成 */"
+    return "\n".join([header, *lines]) + "\n"
+
+
+if __name__ == "__main__":
+    sys.stdout.write(style_defs())
@@ -0,0 +1,190 @@
+"""ETag / Last-Modified による条件付きリクエスト
+
+data.py・テンプレート・Markdownだけで内容が決まるページに使う。
+ETagはそれらのハッシュから作るので、内容が変わらない限り同じ値になり、
+If-None-Match / If-Modified-Since が一致すればページを描画せずに304を返す。
+
+描画結果はETagごとにメモリに保持し、gzip圧縮した本文も一度だけ作って使い回す。
+shared=True のページはログイン状態によらず同じHTMLを返す（個人の状態は
+/api/me/state からJavaScriptで反映する）。
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+
+from compression import COMPRESS_MIN_SIZE, COMPRESS_MIMETYPES, accepts_gzip, gzip_bytes, set_gzip_body
+from content import current_build_version, render_settings
+from lru import LRUCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# ページの内容に影響するファイル（変われば全ページのETagが変わる）
+SITE_FILES = ["app.py", "data.py", "content.py", "highlight.py", "assets.py", "templates/*.html",
+              "static/css/*.css", "static/js/*.js", "static/dist/manifest.json"]
+# ページのHTMLを変える環境変数（app.py で読む）
+SITE_SETTINGS = ["LESSON_INLINE_SECTIONS", "STREAM_LESSONS"]
+# ブラウザ・プロキシがキャッシュを再検証せずに使ってよい秒数
+PAGE_MAX_AGE = int(os.environ.get("PAGE_MAX_AGE", "0"))
+# 描画済みページをメモリに保持する件数
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "256"))
+
+_site_version = None
+_site_version_lock = threading.Lock()
+
+
+def compute_site_version() -> tuple:
+    """(ハッシュ, 最終更新日時のUNIX時刻) を返す
+
+    ファイルに加えて、環境変数・Markdown/Pygmentsのバージョンと変換設定・
+    事前変換ビルドのバージョンも含める（デプロイでどれが変わってもETagが変わる）。
+    """
+    h = hashlib.sha256()
+    latest = 0.0
+    for pattern in SITE_FILES:
+        for path in sorted(glob.glob(os.path.join(BASE_DIR, pattern))):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+            latest = max(latest, os.path.getmtime(path))
+    for name in SITE_SETTINGS:
+        h.update(f"{name}={os.environ.get(name, '')}\n".encode())
+    h.update(json.dumps(render_settings(), sort_keys=True).encode())
+    h.update(current_build_version().encode())
+    return h.hexdigest(), latest
+
+
+def site_version() -> tuple:
+    """サイト全体のバージョン（プロセスごとに一度だけ計算）"""
+    global _site_version
+    if _site_version is None:
+        with _site_version_lock:
+            if _site_version is None:
+                _site_version = compute_site_version()
+    return _site_version
+
+
+class PageCache(LRUCache):
+    """ETag -> [本文, Content-Type, gzip圧縮した本文] のLRUキャッシュ"""
+
+    def __init__(self, maxsize: int = PAGE_CACHE_SIZE):
+        super().__init__(maxsize)
+
+    def store(self, etag: str, body: bytes, mimetype: str) -> list:
+        entry = [body, mimetype, None]
+        self.put(etag, entry)
+        return entry
+
+    def get_gzip(self, entry: list) -> bytes:
+        """圧縮した本文（初回だけ圧縮して保持する）"""
+        if entry[2] is None:
+            compressed = gzip_bytes(entry[0])
+            with self._lock:
+                entry[2] = compressed
+        return entry[2]
+
+page_cache = PageCache()
+
+
+def is_cacheable_request(shared: bool = False) -> bool:
+    """ユーザーごとに内容が変わらないリクエストか"""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if not shared and current_user.is_authenticated:
+        return False
+    # フラッシュメッセージを表示する場合はその回だけ描画する
+    return "_flashes" not in session
+
+
+def page_validators(parts: list) -> tuple:
+    """サイトのバージョンとページ固有の (値, 更新日時) から ETag と Last-Modified を作る"""
+    digest, latest = site_version()
+    h = hashlib.sha256(digest.encode())
+    h.update(request.full_path.encode())
+    for value, mtime in parts:
+        h.update(str(value).encode())
+        latest = max(latest, mtime)
+    last_modified = datetime.fromtimestamp(int(latest), tz=timezone.utc)
+    return h.hexdigest()[:32], last_modified
+
+
+def is_not_modified(etag: str, last_modified: datetime) -> bool:
+    if request.if_none_match:
+        # gzipで返したときは弱いETagになっているので弱い比較にする
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag: str, last_modified: datetime):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_MAX_AGE
+    response.cache_control.must_revalidate = True
+    # ログイン状態で内容が変わるので、Cookieごとに分けてキャッシュさせる
+    response.vary.add("Cookie")
+    return response
+
+
+def cached_response(etag: str, entry: list, last_modified: datetime):
+    """保持している本文からレスポンスを作る（gzip対応のクライアントには圧縮済みの本文）"""
+    body, mimetype, _ = entry
+    response = make_response(body)
+    response.mimetype = mimetype
+    set_validators(response, etag, last_modified)
+    if len(body) >= COMPRESS_MIN_SIZE and mimetype in COMPRESS_MIMETYPES:
+        response.vary.add("Accept-Encoding")
+        if accepts_gzip():
+            set_gzip_body(response, page_cache.get_gzip(entry))
+    return response
+
+
+def tee_to_cache(chunks, etag: str, mimetype: str):
+    """ストリーミングの本文をそのまま流しつつ、全体を page_cache に保存する"""
+    parts = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        parts.append(chunk)
+        yield chunk
+    page_cache.store(etag, b"".join(parts), mimetype)
+
+
+def conditional_page(page_parts=None, shared: bool = False):
+    """ETag / Last-Modified を付け、変わっていなければ304を返すデコレータ
+
+    page_parts(**view_args) はページ固有の (値, 更新日時) のリストを返す。
+    Noneを返した場合（存在しないIDなど）は通常どおりビューを呼ぶ。
+    shared=True はログイン中も同じHTMLを返すページで、ログイン中もキャッシュを使う。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not is_cacheable_request(shared):
+                return view(*args, **kwargs)
+            parts = page_parts(**kwargs) if page_parts else []
+            if parts is None:
+                return view(*args, **kwargs)
+            etag, last_modified = page_validators(parts)
+            if is_not_modified(etag, last_modified):
+                return set_validators(make_response("", 304), etag, last_modified)
+            entry = page_cache.get(etag)
+            if entry is not None:
+                return cached_response(etag, entry, last_modified)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if response.is_streamed:
+                # 送りながら本文を集め、最後まで送れたらキャッシュに入れる
+                response.response = tee_to_cache(response.response, etag, response.mimetype)
+                return set_validators(response, etag, last_modified)
+            entry = page_cache.store(etag, response.get_data(), response.mimetype)
+            return cached_response(etag, entry, last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,81 @@
+"""プロセス内キャッシュ共通のLRU（スレッドセーフ、ヒット数・ミス数を数える）
+
+変換済みHTML・ハイライト・描画済みページ・進捗・ユーザーのキャッシュで使う。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """件数が maxsize を超えたら最も長く使われていないものから捨てるキャッシュ
+
+    ttl（秒）を指定すると、保存してからその時間が過ぎた値はないものとして扱う。
+    maxsize が0以下なら何も保持しない。
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (期限, 値)
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        """値を返す（なければ・期限切れならNone）。ヒット・ミスは数えない"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def record(self, hit: bool):
+        """ヒット・ミスを数える（lookup で取り出した値を呼び出し側で確かめる場合）"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, valid=None):
+        """値を返す（なければ・期限切れ・valid(値) が偽ならNone）"""
+        value = self.lookup(key)
+        hit = value is not None and (valid is None or valid(value))
+        self.record(hit)
+        return value if hit else None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """キャッシュをすべて破棄"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """ヒット数・ミス数などの統計"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,180 @@
+"""リクエストごとの処理時間の計測と /metrics（Prometheusのテキスト形式）
+
+ルートごとの応答時間と、Markdown変換・進捗の読み書き・テンプレート描画といった
+区間ごとの時間をヒストグラムに記録し、キャッシュのヒット数と合わせて公開する。
+METRICS_SERVER_TIMING=1 のときは区間ごとの時間を Server-Timing ヘッダーにも付ける。
+値はプロセス（gunicornのワーカー）ごとに集計される。
+/metrics は METRICS_TOKEN を設定しなければ同じマシンからの直接のアクセスにだけ応答する。
+"""
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, abort, g, has_request_context, request, template_rendered, before_render_template
+
+# ヒストグラムの区切り（秒）
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+METRICS_SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "0") == "1"
+# 設定すると /metrics に "Authorization: Bearer <token>" を要求する
+# （設定しなければループバックからの直接のアクセスだけに応答し、それ以外は404）
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+LOOPBACK_ADDRS = ("127.0.0.1", "::1")
+
+
+class Histogram:
+    """ラベルの組ごとの累積ヒストグラム"""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [バケットごとの件数, 合計, 件数]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            base = format_labels(self.label_names, labels)
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{{{base},le=\"{bound}\"}} {n}")
+            lines.append(f"{self.name}_bucket{{{base},le=\"+Inf\"}} {count}")
+            lines.append(f"{self.name}_sum{{{base}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "ルートごとの応答時間", ("route", "method", "status"))
+section_duration = Histogram(
+    "app_section_duration_seconds", "処理の区間ごとの時間", ("section",))
+
+# キャッシュ名 -> hits / misses を含むdictを返す関数
+_caches = {}
+
+
+def register_cache(name: str, stats):
+    _caches[name] = stats
+
+
+def reset():
+    """記録した時間をすべて破棄する（ウォームアップのリクエストを数えないため）"""
+    request_duration.reset()
+    section_duration.reset()
+
+
+def record_section(section: str, seconds: float):
+    section_duration.observe((section,), seconds)
+    if has_request_context():
+        timings = g.setdefault("metrics_sections", {})
+        timings[section] = timings.get(section, 0.0) + seconds
+
+
+@contextmanager
+def timed(section: str):
+    """with timed("load_progress"): ... の区間の時間を記録する"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_section(section, time.perf_counter() - started)
+
+
+def expose() -> str:
+    lines = request_duration.expose() + section_duration.expose()
+    lines += ["# HELP app_cache_hits_total キャッシュのヒット数", "# TYPE app_cache_hits_total counter"]
+    stats = {name: fn() for name, fn in sorted(_caches.items())}
+    lines += [f'app_cache_hits_total{{cache="{name}"}} {s["hits"]}' for name, s in stats.items()]
+    lines += ["# HELP app_cache_misses_total キャッシュのミス数", "# TYPE app_cache_misses_total counter"]
+    lines += [f'app_cache_misses_total{{cache="{name}"}} {s["misses"]}' for name, s in stats.items()]
+    lines += ["# HELP app_cache_hit_ratio キャッシュのヒット率", "# TYPE app_cache_hit_ratio gauge"]
+    for name, s in stats.items():
+        total = s["hits"] + s["misses"]
+        lines.append(f'app_cache_hit_ratio{{cache="{name}"}} {s["hits"] / total if total else 0:.4f}')
+    return "\n".join(lines) + "\n"
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    labels = (route, request.method, str(response.status_code))
+    if response.is_streamed:
+        # 本文（Markdown変換・描画を含む）はこの後に生成されるので、送り終えて閉じたときに記録する。
+        # ヘッダーはもう送ってしまうため Server-Timing は付けない
+        response.call_on_close(lambda: request_duration.observe(labels, time.perf_counter() - started))
+        return response
+    elapsed = time.perf_counter() - started
+    request_duration.observe(labels, elapsed)
+    if METRICS_SERVER_TIMING:
+        sections = g.get("metrics_sections", {})
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in sections.items()]
+        entries.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault("metrics_templates", []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stack = g.get("metrics_templates")
+    if stack:
+        record_section("render_template", time.perf_counter() - stack.pop())
+
+
+def is_local_request() -> bool:
+    """同じマシンから直接来たリクエストか（同じマシンのリバースプロキシ経由は含めない）"""
+    forwarded = "X-Forwarded-For" in request.headers or "Forwarded" in request.headers
+    return request.remote_addr in LOOPBACK_ADDRS and not forwarded
+
+
+def metrics_view():
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            abort(403)
+    elif not is_local_request():
+        # トークンなしでは外部に公開しない（ルートがあることも見せない）
+        abort(404)
+    return Response(expose(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    """計測のフックと /metrics を登録する"""
+    app.before_request(_before_request)
+    # after_request は登録の逆順に実行されるので、gzip圧縮などより先に登録すればその時間も含められる
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
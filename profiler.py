@@ -0,0 +1,142 @@
+"""リクエスト単位のプロファイラ（必要なときだけ有効にする）
+
+次のどちらかのリクエストを cProfile で計測し、PROFILE_DIR に
+<時刻>-<メソッド>-<エンドポイント>.prof（pstats形式）と上位の関数をまとめた .txt を書き出す。
+ファイル名はURLではなくルールのエンドポイント名にするので、/lessons/python-01 と
+/lessons/python-02 はどちらも lesson_detail として並ぶ（実際のパスは .txt の先頭に書く）。
+
+- PROFILE_SAMPLE_RATE（0〜1）の割合で無作為に選んだリクエスト
+- PROFILE_TOKEN を設定し、X-Profile-Token ヘッダーに同じ値を付けたリクエスト
+
+どちらも設定しなければミドルウェア自体を登録しないので負荷はかからない。
+計測したリクエストのレスポンスには X-Profile-Id ヘッダーでファイル名を返す。
+cProfile はプロセスに1つしか動かせない（3.12以降は sys.monitoring を使う）ので、
+別のリクエストを計測中のときは計測せずにそのまま処理する。
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from werkzeug.exceptions import HTTPException
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+# .txt に載せる関数の数
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "40"))
+# 残しておくプロファイルの数（古いものから削除する）
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+
+# 計測中のリクエストがあるあいだ保持する（同時に2つ enable すると ValueError になる）
+_profile_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_TOKEN)
+
+
+def route_name(url_map, environ) -> str:
+    """リクエストにマッチするルールのエンドポイント名（マッチしなければ "unmatched"）"""
+    if url_map is None:
+        return environ.get("PATH_INFO", "/").strip("/") or "root"
+    try:
+        endpoint, _ = url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        # 404・405・末尾スラッシュのリダイレクトなど
+        return "unmatched"
+    return endpoint
+
+
+def profile_name(method: str, route: str) -> str:
+    """ファイル名に使う "<時刻>-<メソッド>-<エンドポイント>"（ルートと時刻で並ぶ）"""
+    route = re.sub(r"[^A-Za-z0-9_-]+", ".", route) or "root"
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{method}-{route[:80]}"
+
+
+def summarize(profiler: cProfile.Profile, title: str, top_n: int = PROFILE_TOP_N) -> str:
+    out = io.StringIO()
+    out.write(f"{title}\n\n")
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats("cumulative").print_stats(top_n)
+    out.write("\n")
+    stats.sort_stats("tottime").print_stats(top_n)
+    return out.getvalue()
+
+
+def prune(directory: str, keep: int = PROFILE_KEEP):
+    """古いプロファイルを削除して keep 件（.prof の数）に抑える"""
+    names = sorted(n[:-len(".prof")] for n in os.listdir(directory) if n.endswith(".prof"))
+    for name in names[:-keep] if keep > 0 else []:
+        for ext in (".prof", ".txt"):
+            try:
+                os.remove(os.path.join(directory, name + ext))
+            except OSError:
+                pass
+
+
+class RequestProfiler:
+    """app.wsgi_app を包むWSGIミドルウェア"""
+
+    def __init__(self, wsgi_app, url_map=None, directory: str = PROFILE_DIR,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, token: str = PROFILE_TOKEN):
+        self.wsgi_app = wsgi_app
+        # ファイル名をエンドポイント名にするためのURLルール（app.url_map）
+        self.url_map = url_map
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+
+    def should_profile(self, environ) -> bool:
+        header = environ.get("HTTP_X_PROFILE_TOKEN", "")
+        if self.token and header and hmac.compare_digest(header, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self.should_profile(environ) or not _profile_lock.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self.profile(environ, start_response)
+        finally:
+            _profile_lock.release()
+
+    def profile(self, environ, start_response):
+        method = environ.get("REQUEST_METHOD", "GET")
+        path = environ.get("PATH_INFO", "/")
+        name = profile_name(method, route_name(self.url_map, environ))
+
+        def start_with_id(status, headers, exc_info=None):
+            headers.append(("X-Profile-Id", name))
+            return start_response(status, headers, exc_info)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            # 本文の生成（ストリーミングを含む）まで計測するため、ここで読み切る
+            response = self.wsgi_app(environ, start_with_id)
+            try:
+                body = list(response)
+            finally:
+                if hasattr(response, "close"):
+                    response.close()
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            self.write(profiler, name, f"{method} {path} {elapsed * 1000:.1f} ms")
+        return body
+
+    def write(self, profiler: cProfile.Profile, name: str, title: str):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        profiler.dump_stats(f"{path}.prof")
+        with open(f"{path}.txt", 'w', encoding='utf-8') as f:
+            f.write(summarize(profiler, title))
+        prune(self.directory)
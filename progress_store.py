@@ -0,0 +1,527 @@
+"""学習進捗の保存先
+
+ProgressStore を実装したバックエンドを切り替えて使う。
+- JsonProgressStore: progress/<email>.json にユーザーごとの進捗を丸ごと保存（従来の形式）
+- SqliteProgressStore: SQLite（WALモード）に項目ごとの行として保存
+
+既存のJSONファイルは次のコマンドでSQLiteに取り込める:
+    python -m progress_store migrate [--from progress] [--db progress/progress.db]
+"""
+import argparse
+import bisect
+import glob
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from db import LocalConnection, create_schema
+from lru import LRUCache
+
+# 進捗の種類 -> 進捗データのキー
+KIND_KEYS = {"lesson": "lessons", "project": "projects", "task": "tasks"}
+# 同時書き込みで競合したときの再試行回数
+UPDATE_RETRIES = 5
+# 読み込んだ進捗をメモリに保持するユーザー数（JSONのみ）
+PROGRESS_CACHE_SIZE = int(os.environ.get("PROGRESS_CACHE_SIZE", "256"))
+
+
+class ProgressConflict(Exception):
+    """再試行しても他のプロセスとの書き込み競合が解消しなかった"""
+
+
+def empty_progress() -> dict:
+    return {"lessons": {}, "projects": {}, "tasks": {}, "favorites": [], "study_dates": [], "notes": {},
+            "streak": empty_streak()}
+
+
+def normalize_progress(data: dict) -> dict:
+    """既存データとの互換性のため、足りないキーを補う"""
+    if "streak" not in data:
+        # 学習日を昇順に並べ、連続学習日数を求めておく（以降は書き込み時に更新）
+        data["study_dates"] = sorted(set(d for d in data.get("study_dates", []) if d))
+        data["streak"] = compute_streak(data["study_dates"])
+    for key, value in empty_progress().items():
+        data.setdefault(key, value)
+    return data
+
+
+# ===== 学習日と連続学習日数 =====
+# study_dates は "YYYY-MM-DD" の昇順リスト、streak は最後の学習日とそこまでの連続日数
+
+def empty_streak() -> dict:
+    return {"current": 0, "last_day": None}
+
+
+def _previous_day(day: str) -> str:
+    return (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+
+
+def compute_streak(study_dates: list) -> dict:
+    """昇順の学習日から、最後の学習日までの連続日数を求める"""
+    if not study_dates:
+        return empty_streak()
+    current = 1
+    for i in range(len(study_dates) - 1, 0, -1):
+        if study_dates[i - 1] != _previous_day(study_dates[i]):
+            break
+        current += 1
+    return {"current": current, "last_day": study_dates[-1]}
+
+
+def insert_study_date(study_dates: list, streak: dict, day: str) -> bool:
+    """学習日を昇順を保って追加し、streakを更新する（追加したらTrue）"""
+    i = bisect.bisect_left(study_dates, day)
+    if i < len(study_dates) and study_dates[i] == day:
+        return False
+    study_dates.insert(i, day)
+    last_day = streak.get("last_day")
+    if last_day is None or day > last_day:
+        continued = last_day == _previous_day(day)
+        streak["current"] = streak.get("current", 0) + 1 if continued else 1
+        streak["last_day"] = day
+    else:
+        # 過去の日付が追加された場合だけ数え直す
+        streak.update(compute_streak(study_dates))
+    return True
+
+
+def current_streak(streak: dict, today: date) -> int:
+    """今日または昨日まで続いている連続学習日数（途切れていれば0）"""
+    last_day = streak.get("last_day")
+    if last_day and date.fromisoformat(last_day) >= today - timedelta(days=1):
+        return streak.get("current", 0)
+    return 0
+
+
+def copy_progress(progress: dict) -> dict:
+    """進捗データのコピー（値は辞書・リストの中に文字列や真偽値が入るだけなので2段で足りる）"""
+    return {k: v.copy() if isinstance(v, (dict, list)) else v for k, v in progress.items()}
+
+
+class ProgressEditor:
+    """1ユーザーの進捗を変更する操作（ProgressStore.update() に渡される）"""
+
+    def toggle_item(self, kind: str, item_id: str) -> bool:
+        """レッスン・プロジェクト・タスクの完了状態を反転し、新しい状態を返す"""
+        raise NotImplementedError
+
+    def toggle_favorite(self, favorite_key: str) -> bool:
+        """お気に入りを追加/削除し、追加された状態ならTrueを返す"""
+        raise NotImplementedError
+
+    def set_note(self, note_key: str, note: str):
+        """ノートを保存（空の場合は削除）"""
+        raise NotImplementedError
+
+    def add_study_date(self, day: str):
+        """学習日を記録（YYYY-MM-DD）"""
+        raise NotImplementedError
+
+
+class ProgressStore:
+    """学習進捗の保存先のインターフェース"""
+
+    def load(self, email: str) -> dict:
+        """進捗データを辞書で返す（データがなければ空の進捗）"""
+        raise NotImplementedError
+
+    def save(self, email: str, progress: dict):
+        """進捗データを丸ごと置き換える"""
+        raise NotImplementedError
+
+    def update(self, email: str, apply):
+        """apply(editor) で進捗を変更して保存し、applyの戻り値を返す
+
+        他のプロセスと競合した場合は apply を最初からやり直すことがある。
+        """
+        raise NotImplementedError
+
+
+# ===== JSONファイル =====
+
+class DictProgressEditor(ProgressEditor):
+    """進捗データの辞書を直接変更する"""
+
+    def __init__(self, progress: dict):
+        self.progress = progress
+        self.changed = False
+
+    def toggle_item(self, kind: str, item_id: str) -> bool:
+        items = self.progress.setdefault(KIND_KEYS[kind], {})
+        completed = not bool(items.get(item_id))
+        items[item_id] = completed
+        self.changed = True
+        return completed
+
+    def toggle_favorite(self, favorite_key: str) -> bool:
+        favorites = self.progress.setdefault("favorites", [])
+        self.changed = True
+        if favorite_key in favorites:
+            favorites.remove(favorite_key)
+            return False
+        favorites.append(favorite_key)
+        return True
+
+    def set_note(self, note_key: str, note: str):
+        notes = self.progress.setdefault("notes", {})
+        if note:
+            notes[note_key] = note
+        else:
+            notes.pop(note_key, None)
+        self.changed = True
+
+    def add_study_date(self, day: str):
+        if insert_study_date(self.progress["study_dates"], self.progress["streak"], day):
+            self.changed = True
+
+
+class JsonProgressStore(ProgressStore):
+    """ユーザーごとのJSONファイルに保存する
+
+    書き込みは一時ファイルに書いてから rename で置き換えるので、
+    読み込み側が書きかけのファイルを見ることはない。
+    update() はユーザーごとのロックファイルで読み込み〜保存を直列化する。
+
+    読み込んだ内容はファイルの状態（inode・更新日時・サイズ）をキーにLRUで保持し、
+    ファイルが変わっていなければJSONを読み直さない。このキャッシュはロックなしの
+    load() だけで使い、update() はロックを取ったうえで必ずファイルを読み直す
+    （置き換えで inode が使い回されると、状態が一致しても内容が古いことがあるため）。
+    """
+
+    def __init__(self, directory: str, cache_size: int = PROGRESS_CACHE_SIZE):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._cache = LRUCache(cache_size)  # email -> (signature, progress)
+
+    def path(self, email: str) -> str:
+        return os.path.join(self.directory, f"{email}.json")
+
+    def load(self, email: str) -> dict:
+        return self._read(email)[0]
+
+    def _read(self, email: str, use_cache: bool = True) -> tuple:
+        """(進捗データ, ファイルの状態) を返す（use_cache=False は必ずファイルを読む）"""
+        signature = self._current_signature(email)
+        if signature is None:
+            return empty_progress(), None
+        if use_cache:
+            cached = self._cache.get(email, valid=lambda entry: entry[0] == signature)
+            if cached:
+                return copy_progress(cached[1]), signature
+
+        try:
+            with open(self.path(email), "r", encoding="utf-8") as f:
+                signature = self._signature(os.fstat(f.fileno()))
+                progress = normalize_progress(json.load(f))
+        except FileNotFoundError:
+            return empty_progress(), None
+        except (OSError, ValueError):
+            return empty_progress(), "corrupt"
+        self._remember(email, signature, progress)
+        return progress, signature
+
+    def _remember(self, email: str, signature: tuple, progress: dict):
+        self._cache.put(email, (signature, copy_progress(progress)))
+
+    def cache_stats(self) -> dict:
+        """キャッシュのヒット数・ミス数"""
+        return self._cache.stats()
+
+    @staticmethod
+    def _signature(st: os.stat_result) -> tuple:
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _current_signature(self, email: str):
+        try:
+            return self._signature(os.stat(self.path(email)))
+        except FileNotFoundError:
+            return None
+
+    def save(self, email: str, progress: dict):
+        with self._lock(email):
+            self._write(email, progress)
+
+    def _write(self, email: str, progress: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{email}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(progress, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+                # renameしてもinodeと更新日時は変わらないので、書いた内容をそのままキャッシュできる
+                signature = self._signature(os.fstat(f.fileno()))
+            os.replace(tmp_path, self.path(email))
+            self._remember(email, signature, progress)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @contextmanager
+    def _lock(self, email: str):
+        if fcntl is None:
+            # ロックできない環境では update() の競合検出と再試行に任せる
+            yield
+            return
+        lock_path = os.path.join(self.directory, f".{email}.lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def update(self, email: str, apply):
+        for attempt in range(UPDATE_RETRIES):
+            with self._lock(email):
+                # 書き込みの元になるので、キャッシュを使わずにファイルを読み直す
+                progress, signature = self._read(email, use_cache=False)
+                if signature == "corrupt":
+                    # 壊れたファイルは上書きせず、調査用に退避する
+                    os.replace(self.path(email), f"{self.path(email)}.corrupt-{int(time.time())}")
+                    signature = None
+                editor = DictProgressEditor(progress)
+                result = apply(editor)
+                if not editor.changed:
+                    return result
+                # 読み込んだ後に別のプロセスが書き込んでいたらやり直す
+                if self._current_signature(email) == signature:
+                    self._write(email, progress)
+                    return result
+            time.sleep(0.01 * (attempt + 1))
+        raise ProgressConflict(email)
+
+    def emails(self) -> list:
+        """保存されているユーザーの一覧"""
+        paths = glob.glob(os.path.join(self.directory, "*.json"))
+        return sorted(os.path.basename(p)[:-len(".json")] for p in paths)
+
+
+# ===== SQLite =====
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    email TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    UNIQUE (email, kind, item_id)
+);
+CREATE TABLE IF NOT EXISTS favorites (
+    email TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    UNIQUE (email, item_key)
+);
+CREATE TABLE IF NOT EXISTS notes (
+    email TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (email, item_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS study_dates (
+    email TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (email, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS streaks (
+    email TEXT PRIMARY KEY,
+    current INTEGER NOT NULL,
+    last_day TEXT
+) WITHOUT ROWID;
+"""
+
+
+class SqliteProgressEditor(ProgressEditor):
+    """1行ずつ更新する（トランザクション内で使う）"""
+
+    def __init__(self, conn: sqlite3.Connection, email: str):
+        self.conn = conn
+        self.email = email
+
+    def toggle_item(self, kind: str, item_id: str) -> bool:
+        key = KIND_KEYS[kind]
+        row = self.conn.execute(
+            "SELECT completed FROM completions WHERE email = ? AND kind = ? AND item_id = ?",
+            (self.email, key, item_id)).fetchone()
+        completed = not (row and row[0])
+        # ON CONFLICT DO UPDATE は rowid（=追加順）を保つ
+        self.conn.execute(
+            "INSERT INTO completions (email, kind, item_id, completed) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (email, kind, item_id) DO UPDATE SET completed = excluded.completed",
+            (self.email, key, item_id, int(completed)))
+        return completed
+
+    def toggle_favorite(self, favorite_key: str) -> bool:
+        cur = self.conn.execute(
+            "DELETE FROM favorites WHERE email = ? AND item_key = ?", (self.email, favorite_key))
+        if cur.rowcount:
+            return False
+        self.conn.execute(
+            "INSERT INTO favorites (email, item_key) VALUES (?, ?)", (self.email, favorite_key))
+        return True
+
+    def set_note(self, note_key: str, note: str):
+        if note:
+            self.conn.execute(
+                "INSERT INTO notes (email, item_key, body) VALUES (?, ?, ?) "
+                "ON CONFLICT (email, item_key) DO UPDATE SET body = excluded.body",
+                (self.email, note_key, note))
+        else:
+            self.conn.execute(
+                "DELETE FROM notes WHERE email = ? AND item_key = ?", (self.email, note_key))
+
+    def add_study_date(self, day: str):
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO study_dates (email, day) VALUES (?, ?)", (self.email, day))
+        if not cur.rowcount:
+            return
+        row = self.conn.execute(
+            "SELECT current, last_day FROM streaks WHERE email = ?", (self.email,)).fetchone()
+        streak = {"current": row[0], "last_day": row[1]} if row else empty_streak()
+        last_day = streak["last_day"]
+        if last_day is None or day > last_day:
+            continued = last_day == _previous_day(day)
+            streak = {"current": streak["current"] + 1 if continued else 1, "last_day": day}
+        else:
+            # 過去の日付が追加された場合だけ数え直す
+            streak = compute_streak(self._study_dates())
+        _save_streak(self.conn, self.email, streak)
+
+    def _study_dates(self) -> list:
+        return [row[0] for row in self.conn.execute(
+            "SELECT day FROM study_dates WHERE email = ? ORDER BY day", (self.email,))]
+
+
+def _save_streak(conn: sqlite3.Connection, email: str, streak: dict):
+    conn.execute(
+        "INSERT INTO streaks (email, current, last_day) VALUES (?, ?, ?) "
+        "ON CONFLICT (email) DO UPDATE SET current = excluded.current, last_day = excluded.last_day",
+        (email, streak["current"], streak["last_day"]))
+
+
+class SqliteProgressStore(ProgressStore):
+    """SQLite（WALモード）に保存する"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._connections = LocalConnection(db_path)
+        # 接続はスレッドごとに最初に使うときに開く
+        create_schema(db_path, SQLITE_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def close(self):
+        """このスレッドの接続を閉じる"""
+        self._connections.close()
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def load(self, email: str) -> dict:
+        conn = self._connect()
+        progress = empty_progress()
+        for kind, item_id, completed in conn.execute(
+                "SELECT kind, item_id, completed FROM completions WHERE email = ? ORDER BY rowid",
+                (email,)):
+            progress[kind][item_id] = bool(completed)
+        progress["favorites"] = [row[0] for row in conn.execute(
+            "SELECT item_key FROM favorites WHERE email = ? ORDER BY rowid", (email,))]
+        progress["notes"] = dict(conn.execute(
+            "SELECT item_key, body FROM notes WHERE email = ?", (email,)))
+        progress["study_dates"] = [row[0] for row in conn.execute(
+            "SELECT day FROM study_dates WHERE email = ? ORDER BY day", (email,))]
+        row = conn.execute("SELECT current, last_day FROM streaks WHERE email = ?", (email,)).fetchone()
+        if row:
+            progress["streak"] = {"current": row[0], "last_day": row[1]}
+        else:
+            progress["streak"] = compute_streak(progress["study_dates"])
+        return progress
+
+    def save(self, email: str, progress: dict):
+        progress = normalize_progress(dict(progress))
+        with self._transaction() as conn:
+            for table in ("completions", "favorites", "notes", "study_dates", "streaks"):
+                conn.execute(f"DELETE FROM {table} WHERE email = ?", (email,))
+            conn.executemany(
+                "INSERT INTO completions (email, kind, item_id, completed) VALUES (?, ?, ?, ?)",
+                [(email, key, item_id, int(bool(completed)))
+                 for key in KIND_KEYS.values()
+                 for item_id, completed in progress.get(key, {}).items()])
+            conn.executemany(
+                "INSERT OR IGNORE INTO favorites (email, item_key) VALUES (?, ?)",
+                [(email, fav) for fav in progress["favorites"]])
+            conn.executemany(
+                "INSERT INTO notes (email, item_key, body) VALUES (?, ?, ?)",
+                [(email, key, body) for key, body in progress["notes"].items() if body])
+            conn.executemany(
+                "INSERT OR IGNORE INTO study_dates (email, day) VALUES (?, ?)",
+                [(email, day) for day in progress["study_dates"] if day])
+            _save_streak(conn, email, compute_streak(sorted(set(d for d in progress["study_dates"] if d))))
+
+    def update(self, email: str, apply):
+        for attempt in range(UPDATE_RETRIES):
+            try:
+                with self._transaction() as conn:
+                    return apply(SqliteProgressEditor(conn, email))
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+            time.sleep(0.01 * (attempt + 1))
+        raise ProgressConflict(email)
+
+
+def create_progress_store(backend: str, directory: str, db_path: str) -> ProgressStore:
+    """設定値からバックエンドを作る（"json" | "sqlite"）"""
+    if backend == "json":
+        return JsonProgressStore(directory)
+    if backend == "sqlite":
+        return SqliteProgressStore(db_path)
+    raise ValueError(f"unknown progress backend: {backend}")
+
+
+# ===== JSON -> SQLite 移行 =====
+
+def migrate_json_to_sqlite(directory: str, db_path: str) -> int:
+    """progress/*.json をSQLiteに取り込み、取り込んだユーザー数を返す"""
+    source = JsonProgressStore(directory)
+    target = SqliteProgressStore(db_path)
+    emails = source.emails()
+    for email in emails:
+        target.save(email, source.load(email))
+    return len(emails)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="学習進捗の保存先を管理する")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="progress/*.json をSQLiteに取り込む")
+    migrate.add_argument("--from", dest="directory", default="progress", help="JSONファイルのディレクトリ")
+    migrate.add_argument("--db", default=os.path.join("progress", "progress.db"), help="SQLiteファイル")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        count = migrate_json_to_sqlite(args.directory, args.db)
+        print(f"{count}人分の進捗を {args.db} に取り込みました")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""ルートごとの応答時間のベンチマーク
+
+Flaskのテストクライアントで全ルートを未ログイン・ログイン（user@example.com）の
+両方で繰り返し呼び出し、p50 / p95 / p99 と1秒あたりのリクエスト数を表示する。
+ログイン時は進捗ファイルの大きさ（small / medium / large）を変えて計測する。
+app.url_map のルートのうち計測対象にないものがあれば、計測せずに終了コード1で終わる。
+ユーザーと進捗は一時ディレクトリに作るので progress/ のファイルは変更しない。
+
+使い方:
+    python scripts/bench_routes.py                 # 計測してベースラインと比較
+    python scripts/bench_routes.py --save          # 計測結果をベースラインとして保存
+    python scripts/bench_routes.py --route search  # 名前に search を含むものだけ
+
+ベースラインより p50 と p95 がどちらも --threshold（既定 100% = 2倍）以上遅くなった
+項目があれば終了コード1で終わる。マシンの速さの違いや負荷の揺れを打ち消すため、
+アプリと関係のない一定の処理（キャリブレーション）の時間も記録し、
+その比でベースラインを補正してから比較する。遅くなった項目は --retries 回まで
+計測し直し、最も速かった結果で判定する。
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as site  # noqa: E402
+from data import lessons, projects  # noqa: E402
+from assets import get_assets  # noqa: E402
+from progress_store import create_progress_store, normalize_progress  # noqa: E402
+from user_store import SqliteUserStore  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+EMAIL = "user@example.com"
+PASSWORD = "testpass"
+# ベンチマーク用ユーザーのパスワードハッシュの反復回数（ログインの計測がハッシュの計算だけにならないよう小さくする）
+HASH_ITERATIONS = 1000
+# 進捗ファイルの大きさ: (完了済み項目数, ノート数, 学習日数)
+PROGRESS_SIZES = {
+    "small": (10, 2, 10),
+    "medium": (500, 100, 180),
+    "large": (5000, 1000, 1000),
+}
+# 判定で無視する差（ミリ秒）。速いルートのばらつきで失敗しないようにする
+NOISE_MS = 0.2
+
+
+def synthetic_progress(completed: int, notes: int, days: int) -> dict:
+    """実在のレッスンに加えて架空の項目で大きさを調整した進捗"""
+    ids = [lesson["id"] for lesson in lessons] + [f"extra-{i}" for i in range(completed)]
+    today = date.today()
+    return normalize_progress({
+        "lessons": {item_id: True for item_id in ids[:completed]},
+        "projects": {project["id"]: True for project in projects[:completed]},
+        "tasks": {},
+        "favorites": [f"lesson:{item_id}" for item_id in ids[:completed // 10]],
+        "notes": {f"lesson:{item_id}": f"メモ {item_id} " * 5 for item_id in ids[:notes]},
+        "study_dates": [(today - timedelta(days=i)).isoformat() for i in range(days)],
+    })
+
+
+def calibrate() -> float:
+    """マシンの速さの目安（一定の処理にかかるミリ秒の中央値）"""
+    timings = []
+    for _ in range(7):
+        t0 = time.perf_counter()
+        data = b"calibration"
+        for i in range(20000):
+            data = hashlib.sha256(data).digest()
+            json.dumps({"i": i, "data": data.hex()})
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def dist_asset_url() -> str | None:
+    """build_assets でビルドしたCSSのURL（ビルドしていなければNone）"""
+    path = get_assets().get("css/style.css")
+    return f"/static/dist/{path}" if path else None
+
+
+def anonymous_routes() -> list:
+    """(名前, メソッド, URL, JSON本文)"""
+    lesson_id = lessons[0]["id"]
+    project_id = projects[0]["id"]
+    routes = [
+        ("index", "GET", "/", None),
+        ("roadmap", "GET", "/roadmap", None),
+        ("lessons_list", "GET", "/lessons", None),
+        ("lesson_detail", "GET", f"/lessons/{lesson_id}", None),
+        ("projects_list", "GET", "/projects", None),
+        ("project_detail", "GET", f"/projects/{project_id}", None),
+        ("phase2", "GET", "/phase2", None),
+        ("portfolio", "GET", "/portfolio", None),
+        ("faq", "GET", "/faq", None),
+        ("common_mistakes", "GET", "/common-mistakes", None),
+        ("code_examples", "GET", "/code-examples?q=for", None),
+        ("search_page", "GET", "/search?q=Flask", None),
+        ("api_me_state", "GET", f"/api/me/state?items=lesson:{lesson_id}", None),
+        ("api_lesson_section", "GET", f"/api/lessons/{lesson_id}/sections/3", None),
+        ("login_page", "GET", "/login", None),
+        ("metrics", "GET", "/metrics", None),
+        ("static", "GET", "/static/css/style.css", None),
+    ]
+    if dist_asset_url():
+        routes.append(("static_dist", "GET", dist_asset_url(), None))
+    return routes
+
+
+def user_routes() -> list:
+    lesson_id = lessons[0]["id"]
+    project_id = projects[0]["id"]
+    items = ",".join(f"lesson:{lesson['id']}" for lesson in lessons)
+    batch = {"ops": [{"op": "toggle_progress", "kind": "lesson", "item_id": lesson["id"]}
+                     for lesson in lessons[:10]]}
+    return [
+        ("lesson_detail", "GET", f"/lessons/{lesson_id}", None),
+        ("lessons_list", "GET", "/lessons", None),
+        ("dashboard", "GET", "/dashboard", None),
+        ("favorites_page", "GET", "/favorites", None),
+        ("search_page", "GET", "/search?q=Flask", None),
+        ("api_me_state", "GET", f"/api/me/state?items={items}", None),
+        ("api_progress_toggle", "POST", "/api/progress/toggle", {"kind": "lesson", "item_id": lesson_id}),
+        ("api_favorites_toggle", "POST", "/api/favorites/toggle", {"kind": "project", "item_id": project_id}),
+        ("api_notes_save", "POST", "/api/notes/save", {"kind": "lesson", "item_id": lesson_id, "note": "ベンチマーク"}),
+        ("api_progress_batch", "POST", "/api/progress/batch", batch),
+    ]
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def session_routes() -> list:
+    """ログイン・ログアウト（1回ごとに交互に実行するので measure_session で計測する）"""
+    return [
+        ("login", "POST", "/login", None),
+        ("logout", "GET", "/logout", None),
+    ]
+
+
+def endpoint_for(method: str, url: str) -> str:
+    path = url.split("?", 1)[0]
+    return site.app.url_map.bind("localhost").match(path, method=method)[0]
+
+
+def uncovered_endpoints() -> list:
+    """app.url_map にあって計測対象にないルート"""
+    routes = anonymous_routes() + user_routes() + session_routes()
+    covered = {endpoint_for(method, url) for _, method, url, _ in routes}
+    if not dist_asset_url():
+        # static/dist はビルドしたときだけ計測する
+        print("static/dist がないため static_dist は計測しません（python -m build_assets でビルド）\n")
+        covered.add("static_dist")
+    return sorted({rule.endpoint for rule in site.app.url_map.iter_rules()} - covered)
+
+
+def fetch(client, method: str, url: str, body, headers: dict, data: dict | None = None):
+    """本文まで読み切る（ストリーミングのページは最後まで送ってはじめてキャッシュに入る）"""
+    response = client.open(url, method=method, json=body, data=data, headers=headers)
+    response.get_data()
+    response.close()
+    return response
+
+
+def measure(client, method: str, url: str, body, requests: int, warmup: int) -> dict:
+    headers = {"Accept-Encoding": "gzip"}
+    for _ in range(warmup):
+        fetch(client, method, url, body, headers)
+    timings = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        response = fetch(client, method, url, body, headers)
+        timings.append((time.perf_counter() - t0) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} -> {response.status_code}")
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "p50": round(statistics.median(timings), 3),
+        "p95": round(percentile(timings, 95), 3),
+        "p99": round(percentile(timings, 99), 3),
+        "rps": round(requests / elapsed, 1),
+    }
+
+
+def measure_session(client, requests: int, warmup: int) -> dict:
+    """ログインとログアウトを交互に行い、それぞれの時間を計測する"""
+    headers = {"Accept-Encoding": "gzip"}
+    form = {"email": EMAIL, "password": PASSWORD}
+    timings = {"login": [], "logout": []}
+    for i in range(warmup + requests):
+        for name, method, url in (("login", "POST", "/login"), ("logout", "GET", "/logout")):
+            t0 = time.perf_counter()
+            response = fetch(client, method, url, None, headers, data=form if method == "POST" else None)
+            took = time.perf_counter() - t0
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {url} -> {response.status_code}")
+            if i >= warmup:
+                timings[name].append(took * 1000)
+        # フラッシュメッセージを消費して、セッションが大きくならないようにする
+        fetch(client, "GET", "/", None, headers)
+    results = {}
+    for name, values in timings.items():
+        values.sort()
+        results[name] = {
+            "p50": round(statistics.median(values), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "rps": round(len(values) / (sum(values) / 1000), 1),
+        }
+    return results
+
+
+def run(requests: int, warmup: int, select, backend: str) -> dict:
+    """select(キー) が真のルートを計測する"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        site.progress_store = create_progress_store(backend, directory, os.path.join(directory, "progress.db"))
+        site.user_store = SqliteUserStore(os.path.join(directory, "users.db"), iterations=HASH_ITERATIONS)
+        site.user_store.add(EMAIL, "受講生", PASSWORD)
+
+        client = site.app.test_client()
+        for name, method, url, body in anonymous_routes():
+            key = f"anonymous/{name}"
+            if select(key):
+                results[key] = measure(client, method, url, body, requests, warmup)
+
+        if any(select(f"session/{name}") for name, _, _, _ in session_routes()):
+            session = measure_session(site.app.test_client(), requests, warmup)
+            results.update({f"session/{name}": r for name, r in session.items()
+                            if select(f"session/{name}")})
+
+        for size, spec in PROGRESS_SIZES.items():
+            site.progress_store.save(EMAIL, synthetic_progress(*spec))
+            client = site.app.test_client()
+            client.post("/login", data={"email": EMAIL, "password": PASSWORD})
+            client.get("/")  # ログイン時のフラッシュメッセージを消費する
+            for name, method, url, body in user_routes():
+                key = f"user-{size}/{name}"
+                if select(key):
+                    results[key] = measure(client, method, url, body, requests, warmup)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float, scale: float = 1.0) -> list:
+    """p50 と p95 がどちらも閾値を超えて遅くなった項目（ベースラインは scale 倍して比べる）"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        slower = all(current[m] > base[m] * scale * (1 + threshold)
+                     and current[m] - base[m] * scale > NOISE_MS
+                     for m in ("p50", "p95"))
+        if slower:
+            regressions.append((key, base, current))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ルートごとの応答時間のベンチマーク")
+    parser.add_argument("--requests", type=int, default=200, help="1ルートあたりの計測回数")
+    parser.add_argument("--warmup", type=int, default=20, help="計測前に捨てる回数")
+    parser.add_argument("--route", default="", help="名前にこの文字列を含むものだけ計測")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="ベースラインのJSON")
+    # 書き込みのあるAPIはfsyncの時間が実行ごとに1.5倍程度揺れるので、既定は2倍で判定する
+    parser.add_argument("--threshold", type=float, default=1.0,
+                        help="許容する遅くなり方（1.0 = 100%%、ベースラインは補正後の値）")
+    parser.add_argument("--retries", type=int, default=2, help="遅くなった項目を計測し直す回数")
+    parser.add_argument("--save", action="store_true", help="結果をベースラインとして保存する")
+    args = parser.parse_args(argv)
+
+    missing = uncovered_endpoints()
+    if missing:
+        print(f"計測対象にないルートがあります: {', '.join(missing)}（anonymous_routes などに追加してください）")
+        return 1
+
+    calibration = calibrate()
+    results = run(args.requests, args.warmup, lambda key: args.route in key, args.backend)
+    # 計測の前後の平均を使い、途中で負荷が変わった影響を減らす
+    calibration = (calibration + calibrate()) / 2
+    baseline = {}
+    scale = 1.0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        if saved.get("calibration_ms"):
+            scale = calibration / saved["calibration_ms"]
+    print(f"calibration: {calibration:.1f} ms (ベースライン比 x{scale:.2f})\n")
+
+    print(f"{'route':<36} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>9} {'p50 vs base':>12}")
+    for key, r in results.items():
+        base = baseline.get(key)
+        diff = f"{(r['p50'] / (base['p50'] * scale) - 1) * 100:+.0f}%" if base and base["p50"] else "-"
+        print(f"{key:<36} {r['p50']:8.2f} {r['p95']:8.2f} {r['p99']:8.2f} {r['rps']:9.1f} {diff:>12}")
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"requests": args.requests, "backend": args.backend,
+                       "calibration_ms": round(calibration, 2),
+                       "python": sys.version.split()[0], "results": results},
+                      f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nベースラインを保存しました: {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold, scale)
+    for _ in range(args.retries):
+        if not regressions:
+            break
+        suspects = {key for key, _, _ in regressions}
+        retried = run(args.requests, args.warmup, lambda key: key in suspects, args.backend)
+        for key, r in retried.items():
+            results[key] = {m: min(results[key][m], r[m]) if m != "rps" else max(results[key][m], r[m])
+                            for m in r}
+        regressions = compare(results, baseline, args.threshold, scale)
+    if regressions:
+        print(f"\n{len(regressions)}件のルートがベースラインより遅くなっています:")
+        for key, base, current in regressions:
+            print(f"  {key}: p50 {base['p50'] * scale:.2f} -> {current['p50']:.2f} ms, "
+                  f"p95 {base['p95'] * scale:.2f} -> {current['p95']:.2f} ms (補正後)")
+        return 1
+    if baseline:
+        print("\nベースラインからの遅延はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""多数の受講生の同時アクセスを再現する負荷試験
+
+gunicornでアプリをlocalhostに起動し、架空の受講生（learner<N>@example.com）が
+ログイン・レッスン閲覧・進捗の切り替え・お気に入り・ノート保存を
+考える時間（think time）をはさみながら繰り返す。
+終了後にエンドポイントごとのスループット・エラー率・応答時間（p50/p95/p99）を表示する。
+リダイレクトは追わず、ログイン画面への転送（ログインしていない扱い）や
+JSONでないAPIの応答もエラーとして数える。
+受講生のアカウントと進捗は一時ディレクトリに保存するので progress/ のファイルは変更しない。
+
+使い方:
+    python scripts/loadtest.py [--learners 2000] [--concurrency 100] [--duration 60]
+                               [--workers 4] [--backend json|sqlite] [--think-ms 500]
+                               [--hash-iterations 1000]
+
+gunicornのワーカー数を変えて実行し、スループットと応答時間の変化から必要な数を見積もる。
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import queue
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+PASSWORD = "loadtest"
+# 受講生のパスワードハッシュの既定の反復回数（本番の設定だとログインの計算が結果の大半を占める）
+HASH_ITERATIONS = 1000
+# 起動を待つ最大秒数
+STARTUP_TIMEOUT = 60
+
+
+def learner_email(i: int) -> str:
+    return f"learner{i}@example.com"
+
+
+def create_app():
+    """gunicorn 'loadtest:create_app()' 用: 架空の受講生を追加したアプリ"""
+    import app as site
+    from progress_store import create_progress_store
+    from user_store import SqliteUserStore, hash_password
+
+    directory = os.environ["LOADTEST_PROGRESS_DIR"]
+    iterations = int(os.environ.get("LOADTEST_HASH_ITERATIONS", HASH_ITERATIONS))
+    site.user_store = SqliteUserStore(os.path.join(directory, "users.db"), iterations=iterations)
+    # 全員同じパスワードなのでハッシュは1つだけ作る（ソルトも共通になるが試験用なので問題ない）
+    password_hash = hash_password(PASSWORD, iterations)
+    site.user_store.add_many((learner_email(i), f"受講生{i}", password_hash)
+                             for i in range(int(os.environ["LOADTEST_USERS"])))
+    # preload_app ではここはマスターで動くので、書き込みに使った接続をワーカーに持ち越さない
+    site.user_store.close()
+    site.progress_store = create_progress_store(
+        os.environ.get("LOADTEST_BACKEND", "json"), directory, os.path.join(directory, "progress.db"))
+    return site.app
+
+
+class Stats:
+    """エンドポイントごとの応答時間とエラー数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint: str, elapsed_ms: float, ok: bool):
+        with self._lock:
+            self.timings[endpoint].append(elapsed_ms)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """リダイレクトを追わず、3xxをそのまま返させる"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Learner:
+    """1人の受講生（Cookieを保持してセッションを続ける）"""
+
+    def __init__(self, base_url: str, index: int, lesson_ids: list, project_ids: list):
+        self.base_url = base_url
+        self.email = learner_email(index)
+        self.lesson_ids = lesson_ids
+        self.project_ids = project_ids
+        self.logged_in = False
+        self.opener = urllib.request.build_opener(
+            NoRedirect(), urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, stats: Stats, endpoint: str, path: str, data: bytes | None = None,
+                content_type: str | None = None, redirect_to: str | None = None) -> bool:
+        """1回リクエストして記録し、期待どおりの応答だったかを返す
+
+        redirect_to を指定したときはそのパスへの3xxだけを成功とし、
+        指定しなければ3xx（ログイン画面への転送など）はエラーにする。
+        /api/ はJSONで返ってこなければエラーにする。
+        """
+        req = urllib.request.Request(self.base_url + path, data=data)
+        req.add_header("Accept-Encoding", "identity")
+        if content_type:
+            req.add_header("Content-Type", content_type)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=30) as res:
+                res.read()
+                status, headers = res.status, res.headers
+        except urllib.error.HTTPError as e:
+            # NoRedirect により3xxもここに来る
+            e.read()
+            status, headers = e.code, e.headers
+            e.close()
+        except (urllib.error.URLError, OSError):
+            status, headers = None, None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if status is None or status >= 400:
+            ok = False
+        elif 300 <= status < 400:
+            location = urllib.parse.urlsplit(headers.get("Location", "")).path
+            ok = redirect_to is not None and location == redirect_to
+        else:
+            ok = redirect_to is None and (not path.startswith("/api/")
+                                          or headers.get_content_type() == "application/json")
+        stats.record(endpoint, elapsed_ms, ok)
+        return ok
+
+    def post_json(self, stats: Stats, endpoint: str, path: str, payload: dict):
+        return self.request(stats, endpoint, path, json.dumps(payload).encode(), "application/json")
+
+    def session(self, stats: Stats, think):
+        """ログインして何ページか読み、進捗などを更新する"""
+        if not self.logged_in:
+            form = urllib.parse.urlencode({"email": self.email, "password": PASSWORD}).encode()
+            # 成功すればトップページへ転送される（失敗するとログイン画面が200で返る）
+            self.logged_in = self.request(stats, "POST /login", "/login", form,
+                                          "application/x-www-form-urlencoded", redirect_to="/")
+            think()
+        self.request(stats, "GET /lessons", "/lessons")
+        think()
+        for _ in range(random.randint(1, 3)):
+            lesson_id = random.choice(self.lesson_ids)
+            self.request(stats, "GET /lessons/<id>", f"/lessons/{lesson_id}")
+            self.request(stats, "GET /api/me/state", f"/api/me/state?items=lesson:{lesson_id}")
+            think()
+            action = random.random()
+            if action < 0.5:
+                self.post_json(stats, "POST /api/progress/batch", "/api/progress/batch", {"ops": [
+                    {"op": "toggle_progress", "kind": "lesson", "item_id": lesson_id}]})
+            elif action < 0.7:
+                self.post_json(stats, "POST /api/progress/batch", "/api/progress/batch", {"ops": [
+                    {"op": "toggle_favorite", "kind": "lesson", "item_id": lesson_id}]})
+            elif action < 0.85:
+                self.post_json(stats, "POST /api/progress/batch", "/api/progress/batch", {"ops": [
+                    {"op": "save_note", "kind": "lesson", "item_id": lesson_id,
+                     "note": f"{self.email} のメモ {random.randint(0, 999)}"}]})
+            think()
+        if random.random() < 0.3:
+            self.request(stats, "GET /projects/<id>", f"/projects/{random.choice(self.project_ids)}")
+            think()
+        if random.random() < 0.3:
+            self.request(stats, "GET /dashboard", "/dashboard")
+            think()
+        if random.random() < 0.2:
+            self.request(stats, "GET /search", "/search?q=" + urllib.parse.quote(random.choice(
+                ["Flask", "for", "関数", "リスト", "SQL", "fetch"])))
+            think()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, workers: int, learners: int, directory: str, backend: str,
+                 hash_iterations: int):
+    env = dict(os.environ, LOADTEST_USERS=str(learners), LOADTEST_PROGRESS_DIR=directory,
+               LOADTEST_BACKEND=backend, LOADTEST_HASH_ITERATIONS=str(hash_iterations))
+    command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+               "--pythonpath", os.path.join(BASE_DIR, "scripts"),
+               "-b", f"127.0.0.1:{port}", "-w", str(workers), "--log-level", "warning",
+               "loadtest:create_app()"]
+    server = subprocess.Popen(command, cwd=BASE_DIR, env=env)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("gunicornの起動に失敗しました")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicornが時間内に起動しませんでした")
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def report(stats: Stats, elapsed: float):
+    total = sum(len(v) for v in stats.timings.values())
+    errors = sum(stats.errors.values())
+    print(f"\n{'endpoint':<28} {'count':>7} {'req/s':>8} {'errors':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint in sorted(stats.timings):
+        timings = sorted(stats.timings[endpoint])
+        print(f"{endpoint:<28} {len(timings):7d} {len(timings) / elapsed:8.1f} "
+              f"{stats.errors[endpoint]:7d} {statistics.median(timings):8.1f} "
+              f"{percentile(timings, 95):8.1f} {percentile(timings, 99):8.1f}")
+    print(f"\n合計 {total}件 / {elapsed:.1f}秒 = {total / elapsed:.1f} req/s, "
+          f"エラー率 {errors / total * 100 if total else 0:.2f}% (応答時間はミリ秒)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多数の受講生の同時アクセスを再現する負荷試験")
+    parser.add_argument("--learners", type=int, default=2000, help="架空の受講生の数")
+    parser.add_argument("--concurrency", type=int, default=100, help="同時にアクセスする受講生の数")
+    parser.add_argument("--duration", type=float, default=60, help="実行する秒数")
+    parser.add_argument("--workers", type=int, default=4, help="gunicornのワーカー数")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--think-ms", type=float, default=500, help="操作の間の平均の待ち時間（指数分布）")
+    parser.add_argument("--hash-iterations", type=int, default=HASH_ITERATIONS,
+                        help="受講生のパスワードハッシュの反復回数（ログインの重さ）")
+    parser.add_argument("--url", help="起動済みのサーバーを使う（gunicornを起動しない）")
+    args = parser.parse_args(argv)
+
+    from data import lessons, projects
+    lesson_ids = [lesson["id"] for lesson in lessons]
+    project_ids = [project["id"] for project in projects]
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = None
+        base_url = args.url
+        if not base_url:
+            port = free_port()
+            server = start_server(port, args.workers, args.learners, directory, args.backend,
+                                  args.hash_iterations)
+            base_url = f"http://127.0.0.1:{port}"
+        try:
+            idle = queue.Queue()
+            for i in range(args.learners):
+                idle.put(Learner(base_url, i, lesson_ids, project_ids))
+            stats = Stats()
+            deadline = time.time() + args.duration
+
+            def think():
+                remaining = deadline - time.time()
+                if args.think_ms > 0 and remaining > 0:
+                    time.sleep(min(random.expovariate(1000 / args.think_ms), remaining))
+
+            def worker():
+                # 空いている受講生を1人取り出して1セッション分操作し、列に戻す
+                while time.time() < deadline:
+                    try:
+                        learner = idle.get(timeout=1)
+                    except queue.Empty:
+                        continue
+                    try:
+                        learner.session(stats, think)
+                    finally:
+                        idle.put(learner)
+
+            print(f"{base_url} に {args.learners}人の受講生で {args.concurrency}並列 "
+                  f"{args.duration:.0f}秒 (workers={args.workers}, backend={args.backend})")
+            started = time.perf_counter()
+            threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            report(stats, time.perf_counter() - started)
+        finally:
+            if server:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=30)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
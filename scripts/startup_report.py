@@ -0,0 +1,122 @@
+"""アプリ起動（import app）にかかる時間の内訳を表示する
+
+新しいPythonプロセスで `python -X importtime -c "import app"` を実行し、
+時間のかかっているモジュールとパッケージごとの合計を表示する。
+起動時間（複数回の中央値）が、同じ回に計測した flask だけの import の
+予算の倍率（既定 1.6倍）を超えたとき、または markdown などの遅延importのはずの
+モジュールが読み込まれていたときは終了コード1で終わる（CIでの起動時間の回帰チェック用）。
+倍率で判定するので、マシンの速さによらず同じ予算で使える。
+
+使い方:
+    python scripts/startup_report.py [--top 20] [--runs 5] [--budget-ratio 1.6] [--budget-ms 0]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 予算の基準にするモジュール（アプリが必ず読み込むもの）
+BASELINE_MODULE = "flask"
+# 予算: import app の時間が基準の何倍までか（環境変数 STARTUP_BUDGET_RATIO、0なら判定しない）
+# 現在は1.2〜1.3倍程度
+DEFAULT_BUDGET_RATIO = float(os.environ.get("STARTUP_BUDGET_RATIO", "1.6"))
+# ミリ秒での上限（環境変数 STARTUP_BUDGET_MS、既定の0は判定しない。マシンを固定したCI向け）
+DEFAULT_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "0"))
+# 起動時に読み込まれていないことを確認するモジュール（最初の変換時に読み込む）
+LAZY_MODULES = ["markdown", "pygments"]
+
+
+def run_importtime(module: str = "app") -> tuple:
+    """(経過秒数, [(モジュール名, 自身のμs, 累計μs, 深さ)]) を返す"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} に失敗しました:\n{result.stderr}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+def parse_importtime(output: str) -> list:
+    """-X importtime の出力を解析する"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def by_package(rows: list) -> dict:
+    """トップレベルのパッケージごとの自身の時間の合計（μs）"""
+    totals = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        totals[name.split(".")[0]] += self_us
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="アプリ起動時間の内訳を表示する")
+    parser.add_argument("--module", default="app", help="読み込むモジュール")
+    parser.add_argument("--top", type=int, default=20, help="表示するモジュール数")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（中央値で判定）")
+    parser.add_argument("--budget-ratio", type=float, default=DEFAULT_BUDGET_RATIO,
+                        help=f"import の累計時間の上限（{BASELINE_MODULE} だけの import の倍率、0なら判定しない）")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="import の累計時間の上限（ミリ秒、0なら判定しない）")
+    args = parser.parse_args(argv)
+
+    runs = []
+    baseline_ms = []
+    for _ in range(max(1, args.runs)):
+        # 基準も同じ回に交互に計測し、マシンの速さや負荷の揺れを打ち消す
+        runs.append(run_importtime(args.module))
+        _, baseline_rows = run_importtime(BASELINE_MODULE)
+        baseline_ms.append(next(r[2] for r in baseline_rows if r[0] == BASELINE_MODULE) / 1000)
+    import_ms = [next(r[2] for r in rows if r[0] == args.module) / 1000 for _, rows in runs]
+    median_ms = statistics.median(import_ms)
+    ratio = median_ms / statistics.median(baseline_ms)
+    # 表示は中央値に最も近い回のもの
+    _, rows = runs[min(range(len(runs)), key=lambda i: abs(import_ms[i] - median_ms))]
+
+    print(f"import {args.module}: 中央値 {median_ms:.1f} ms "
+          f"(最小 {min(import_ms):.1f} ms / 最大 {max(import_ms):.1f} ms, {len(runs)}回)")
+    print(f"import {BASELINE_MODULE}: 中央値 {statistics.median(baseline_ms):.1f} ms "
+          f"(import {args.module} はその {ratio:.2f}倍)")
+    print(f"\n累計時間の上位{args.top}モジュール:")
+    for name, self_us, cumulative_us, depth in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (自身 {self_us / 1000:6.1f} ms)  {'  ' * depth}{name}")
+    print("\nパッケージごとの合計（自身の時間）:")
+    for package, total in sorted(by_package(rows).items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {total / 1000:8.1f} ms  {package}")
+
+    failed = False
+    loaded = {name.split(".")[0] for name, _, _, _ in rows}
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    if eager:
+        print(f"\n起動時に読み込まれています（遅延importのはず）: {', '.join(eager)}")
+        failed = True
+    if args.budget_ratio and ratio > args.budget_ratio:
+        print(f"\n起動時間が予算を超えています: {BASELINE_MODULE} の {ratio:.2f}倍 > {args.budget_ratio:.2f}倍")
+        failed = True
+    elif args.budget_ratio:
+        print(f"\n予算内です: {BASELINE_MODULE} の {ratio:.2f}倍 <= {args.budget_ratio:.2f}倍")
+    if args.budget_ms and median_ms > args.budget_ms:
+        print(f"起動時間が予算を超えています: {median_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        failed = True
+    elif args.budget_ms:
+        print(f"予算内です: {median_ms:.1f} ms <= {args.budget_ms:.1f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""進捗の同時書き込みで更新が失われないことを確かめるストレステスト
+
+複数のプロセス（gunicornのワーカー相当）から同じユーザーに対して
+レッスンの完了・お気に入り・ノートの更新を同時に大量に行い、
+最後にすべての更新が残っていることを確認する。
+
+使い方:
+    python scripts/stress_progress.py [--workers 8] [--toggles 400] [--backend json|sqlite]
+
+更新が失われていれば終了コード1で終わる。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress_store import create_progress_store  # noqa: E402
+
+EMAIL = "stress@example.com"
+
+
+def run_worker(backend: str, directory: str, db_path: str, worker: int, count: int) -> int:
+    """担当分の項目を1回ずつ更新する（各項目は1つのワーカーだけが触る）"""
+    store = create_progress_store(backend, directory, db_path)
+    for i in range(count):
+        item_id = f"w{worker}-{i}"
+        if i % 3 == 0:
+            store.update(EMAIL, lambda editor: editor.toggle_item("lesson", item_id))
+        elif i % 3 == 1:
+            store.update(EMAIL, lambda editor: editor.toggle_favorite(f"lesson:{item_id}"))
+        else:
+            store.update(EMAIL, lambda editor: editor.set_note(f"lesson:{item_id}", item_id))
+    return count
+
+
+def verify(progress: dict, workers: int, per_worker: int) -> list:
+    """失われた更新の一覧を返す"""
+    missing = []
+    favorites = set(progress["favorites"])
+    for worker in range(workers):
+        for i in range(per_worker):
+            item_id = f"w{worker}-{i}"
+            if i % 3 == 0 and progress["lessons"].get(item_id) is not True:
+                missing.append(f"lesson {item_id}")
+            elif i % 3 == 1 and f"lesson:{item_id}" not in favorites:
+                missing.append(f"favorite {item_id}")
+            elif i % 3 == 2 and progress["notes"].get(f"lesson:{item_id}") != item_id:
+                missing.append(f"note {item_id}")
+    return missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="進捗の同時書き込みストレステスト")
+    parser.add_argument("--workers", type=int, default=8, help="同時に書き込むプロセス数")
+    parser.add_argument("--toggles", type=int, default=400, help="全体の更新回数")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args(argv)
+
+    per_worker = max(1, args.toggles // args.workers)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "progress.db")
+        store = create_progress_store(args.backend, directory, db_path)
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(run_worker, args.backend, directory, db_path, w, per_worker)
+                       for w in range(args.workers)]
+            total = sum(f.result() for f in futures)
+        elapsed = time.perf_counter() - started
+
+        missing = verify(store.load(EMAIL), args.workers, per_worker)
+
+    print(f"backend={args.backend} workers={args.workers} updates={total} "
+          f"elapsed={elapsed:.2f}s ({total / elapsed:.0f} updates/s)")
+    if missing:
+        print(f"失われた更新: {len(missing)}件 (例: {', '.join(missing[:5])})")
+        return 1
+    print("失われた更新はありませんでした")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""レッスン・プロジェクトの全文検索
+
+タイトル・説明・カテゴリとMarkdown本文を文字bi-gramに分割した
+転置インデックスで検索する。分かち書きが不要なので日本語でも使える。
+"""
+import math
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+
+from content import markdown_path
+from data import get_lesson_by_id, get_project_by_id, lessons, projects
+
+# フィールドごとの重み（タイトルに一致したものを上位にする）
+FIELD_WEIGHTS = {"title": 5.0, "description": 2.0, "category": 2.0, "body": 1.0}
+SNIPPET_WIDTH = 40
+
+_WORD_RE = re.compile(r"\w+")
+_FENCE_RE = re.compile(r"^```.*$", re.MULTILINE)
+_LINK_RE = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+_MARKUP_RE = re.compile(r"^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+|[*`|]+", re.MULTILINE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """全角・半角と大文字・小文字の違いをなくす"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def tokenize(text: str, unigrams: bool = False) -> list:
+    """正規化済みの文字列を文字bi-gramに分割（1文字の語はそのまま）
+
+    unigrams=True のときは1文字の検索語に対応するため各文字も加える。
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        if len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            if unigrams:
+                tokens.extend(word)
+    return tokens
+
+
+def markdown_to_text(source: str) -> str:
+    """Markdownの記号を取り除いて検索・抜粋用のプレーンテキストにする"""
+    text = _FENCE_RE.sub(" ", source)
+    text = _LINK_RE.sub(r"\1", text)
+    text = _HTML_TAG_RE.sub(" ", text)
+    text = _MARKUP_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+@dataclass
+class Document:
+    key: str
+    kind: str  # "lesson" | "project"
+    item: dict
+    text: str  # 正規化済みの全フィールド（一致確認用）
+    body: str  # 抜粋用の本文
+    tokens: dict = field(default_factory=dict)  # token -> 重み付き出現回数
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    item: dict
+    score: float
+    snippet: tuple | None  # (前, 一致部分, 後)
+
+
+class SearchIndex:
+    """文字bi-gramの転置インデックス"""
+
+    def __init__(self):
+        self.documents = {}  # key -> Document
+        self.postings = {}  # token -> {key: 重み付き出現回数}
+        self._lock = threading.Lock()
+
+    def add_document(self, kind: str, item: dict, fields: dict):
+        """ドキュメントを追加（同じキーがあれば置き換え）"""
+        key = f"{kind}:{item['id']}"
+        weighted = {}
+        for name, value in fields.items():
+            weight = FIELD_WEIGHTS.get(name, 1.0)
+            for token in tokenize(normalize(value or ""), unigrams=True):
+                weighted[token] = weighted.get(token, 0.0) + weight
+        doc = Document(
+            key=key,
+            kind=kind,
+            item=item,
+            text=" ".join(normalize(v or "") for v in fields.values()),
+            body=fields.get("body") or "",
+            tokens=weighted,
+        )
+        with self._lock:
+            self._remove(key)
+            self.documents[key] = doc
+            for token, tf in weighted.items():
+                self.postings.setdefault(token, {})[key] = tf
+
+    def remove_document(self, kind: str, item_id: str):
+        """ドキュメントを削除"""
+        with self._lock:
+            self._remove(f"{kind}:{item_id}")
+
+    def _remove(self, key: str):
+        doc = self.documents.pop(key, None)
+        if not doc:
+            return
+        for token in doc.tokens:
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self.postings[token]
+
+    def search(self, query: str, kind: str | None = None, limit: int | None = None) -> list:
+        """スペース区切りの語をすべて含むドキュメントをスコア順に返す"""
+        terms = [normalize(t) for t in query.split()]
+        terms = [t for t in terms if tokenize(t)]
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self.documents) or 1
+            scores = None
+            for term in terms:
+                term_scores = self._score_term(term, n_docs)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {k: s + term_scores[k] for k, s in scores.items() if k in term_scores}
+                if not scores:
+                    return []
+
+            hits = []
+            for key, score in scores.items():
+                doc = self.documents[key]
+                if kind and doc.kind != kind:
+                    continue
+                # bi-gramがすべて含まれていても連続していない場合があるので確認
+                if not all(term in doc.text for term in terms):
+                    continue
+                hits.append(SearchHit(doc.kind, doc.item, score, make_snippet(doc.body, terms[0])))
+
+        hits.sort(key=lambda hit: -hit.score)
+        return hits[:limit] if limit else hits
+
+    def _score_term(self, term: str, n_docs: int) -> dict:
+        postings = [self.postings.get(token, {}) for token in set(tokenize(term))]
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting.keys()
+        scores = {}
+        for posting in postings:
+            idf = math.log(1 + n_docs / len(posting)) if posting else 0.0
+            for key in candidates:
+                scores[key] = scores.get(key, 0.0) + posting[key] * idf
+        return scores
+
+    def __len__(self):
+        return len(self.documents)
+
+
+def make_snippet(body: str, term: str) -> tuple | None:
+    """本文から検索語の前後を切り出す"""
+    if not body:
+        return None
+    pos = body.lower().find(term)
+    if pos < 0:
+        return None
+    start = max(0, pos - SNIPPET_WIDTH)
+    end = min(len(body), pos + len(term) + SNIPPET_WIDTH)
+    before = ("…" if start > 0 else "") + body[start:pos]
+    after = body[pos + len(term):end] + ("…" if end < len(body) else "")
+    return (before, body[pos:pos + len(term)], after)
+
+
+def read_body(item_id: str) -> str:
+    """レッスン本文のプレーンテキスト（ファイルがなければ空文字）"""
+    try:
+        with open(markdown_path(item_id), 'r', encoding='utf-8') as f:
+            return markdown_to_text(f.read())
+    except OSError:
+        return ""
+
+
+def index_lesson(index: SearchIndex, lesson: dict):
+    index.add_document("lesson", lesson, {
+        "title": lesson.get("title"),
+        "description": lesson.get("description"),
+        "category": lesson.get("category"),
+        "body": read_body(lesson["id"]),
+    })
+
+
+def index_project(index: SearchIndex, project: dict):
+    index.add_document("project", project, {
+        "title": project.get("title"),
+        "description": project.get("description"),
+        "body": read_body(project["id"]),
+    })
+
+
+def build_search_index() -> SearchIndex:
+    """すべてのレッスン・プロジェクトからインデックスを作る"""
+    index = SearchIndex()
+    for lesson in lessons:
+        index_lesson(index, lesson)
+    for project in projects:
+        index_project(index, project)
+    return index
+
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """検索インデックス（プロセスごとに初回利用時に構築）"""
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                _search_index = build_search_index()
+    return _search_index
+
+
+def reindex_item(item_id: str) -> bool:
+    """1件分の本文を読み直してインデックスを更新する（data.py にないIDならFalse）"""
+    index = get_search_index()
+    lesson = get_lesson_by_id(item_id)
+    if lesson:
+        index_lesson(index, lesson)
+        return True
+    project = get_project_by_id(item_id)
+    if project:
+        index_project(index, project)
+        return True
+    return False
@@ -0,0 +1,20 @@
+// お気に入りボタンの処理
+document.querySelectorAll('.favorite-btn').forEach(btn => {
+    btn.addEventListener('click', async function() {
+        const kind = this.dataset.kind;
+        const id = this.dataset.id;
+
+        try {
+            const data = await progressQueue.enqueue({ op: 'toggle_favorite', item_id: id, kind: kind });
+            if (data.ok) {
+                if (data.is_favorite) {
+                    this.classList.add('active');
+                } else {
+                    this.classList.remove('active');
+                }
+            }
+        } catch (error) {
+            console.error('お気に入りの更新に失敗しました:', error);
+        }
+    });
+});
@@ -0,0 +1,50 @@
+// レッスンの残りの節を、スクロールで近づいたときに読み込む
+// 対象: .lesson-section-pending[data-section-url]（/api/lessons/<id>/sections/<n> が {html} を返す）
+(function () {
+    async function load(section) {
+        if (section.dataset.loading) return;
+        section.dataset.loading = '1';
+        try {
+            const res = await fetch(section.dataset.sectionUrl);
+            if (!res.ok) throw new Error('通信に失敗しました');
+            const data = await res.json();
+            section.innerHTML = data.html;
+            section.classList.remove('lesson-section-pending');
+        } catch (error) {
+            console.error('節の読み込みに失敗しました:', error);
+            delete section.dataset.loading;
+        }
+    }
+
+    function init() {
+        const pending = document.querySelectorAll('.lesson-section-pending[data-section-url]');
+        if (!pending.length) return;
+        if (!('IntersectionObserver' in window)) {
+            pending.forEach(load);
+            return;
+        }
+        // 画面に入る少し手前で読み込み始める
+        const observer = new IntersectionObserver(function (entries) {
+            entries.forEach(entry => {
+                if (!entry.isIntersecting) return;
+                observer.unobserve(entry.target);
+                load(entry.target);
+            });
+        }, { rootMargin: '800px 0px' });
+        pending.forEach(section => observer.observe(section));
+
+        // 目次から読み込み前の節へ移動したときは、その節まで読み込んでおく
+        document.querySelectorAll('.lesson-toc a').forEach(link => {
+            link.addEventListener('click', function () {
+                const target = document.querySelector(this.getAttribute('href'));
+                if (target && target.classList.contains('lesson-section-pending')) load(target);
+            });
+        });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', init);
+    } else {
+        init();
+    }
+})();
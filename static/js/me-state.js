@@ -0,0 +1,42 @@
+// 全員に同じHTMLを返すページに、ログインユーザーの状態を反映する
+// - data-me-item="lesson:python-01" を持つ要素の項目について /api/me/state を1回だけ呼ぶ
+// - ログインしていれば [data-me-auth] を表示、[data-me-anon] を非表示にする
+// - お気に入りボタン（.favorite-btn）は共通で反映し、それ以外は
+//   ページのスクリプトが 'me-state' イベント（detail に状態）を受け取って反映する
+(function () {
+    const script = document.currentScript;
+    const stateUrl = script.dataset.stateUrl;
+
+    async function load() {
+        const keys = new Set();
+        document.querySelectorAll('[data-me-item]').forEach(el => keys.add(el.dataset.meItem));
+
+        let state;
+        try {
+            const params = new URLSearchParams({ items: Array.from(keys).join(',') });
+            const res = await fetch(stateUrl + '?' + params.toString(), { credentials: 'same-origin' });
+            if (!res.ok) return;
+            state = await res.json();
+        } catch (error) {
+            console.error('ログイン状態の取得に失敗しました:', error);
+            return;
+        }
+        if (!state.authenticated) return;
+
+        document.querySelectorAll('[data-me-auth]').forEach(el => { el.hidden = false; });
+        document.querySelectorAll('[data-me-anon]').forEach(el => { el.hidden = true; });
+        document.querySelectorAll('[data-me-name]').forEach(el => { el.textContent = state.name; });
+        document.querySelectorAll('.favorite-btn[data-kind][data-id]').forEach(btn => {
+            const item = state.items[btn.dataset.kind + ':' + btn.dataset.id];
+            btn.classList.toggle('active', Boolean(item && item.favorite));
+        });
+
+        document.dispatchEvent(new CustomEvent('me-state', { detail: state }));
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', load);
+    } else {
+        load();
+    }
+})();
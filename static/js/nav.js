@@ -0,0 +1,22 @@
+// ハンバーガーメニューのトグル
+document.addEventListener('DOMContentLoaded', function () {
+    const navToggle = document.getElementById('navToggle');
+    const navMenu = document.getElementById('navMenu');
+
+    if (navToggle && navMenu) {
+        navToggle.addEventListener('click', function () {
+            navMenu.classList.toggle('active');
+            navToggle.classList.toggle('active');
+        });
+
+        // メニューリンクをクリックしたら閉じる（モバイル用）
+        navMenu.querySelectorAll('a').forEach(link => {
+            link.addEventListener('click', function () {
+                if (window.innerWidth <= 1024) {
+                    navMenu.classList.remove('active');
+                    navToggle.classList.remove('active');
+                }
+            });
+        });
+    }
+});
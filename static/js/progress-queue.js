@@ -0,0 +1,54 @@
+// 進捗・お気に入り・ノートの更新をキューにためて /api/progress/batch にまとめて送る
+// 使い方: const result = await progressQueue.enqueue({ op: 'toggle_progress', kind: 'lesson', item_id: 'python-01' });
+(function () {
+    const script = document.currentScript;
+    const batchUrl = script.dataset.batchUrl;
+    const FLUSH_DELAY = 300;  // ミリ秒。この間のクリックを1リクエストにまとめる
+    const MAX_BATCH = 100;    // サーバー側の BATCH_MAX_OPS と合わせる
+
+    let pending = [];
+    let timer = null;
+
+    async function send(batch) {
+        try {
+            const res = await fetch(batchUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ops: batch.map(item => item.op) }),
+                keepalive: true  // ページを離れる途中でも送信を完了させる
+            });
+            if (!res.ok) throw new Error('通信に失敗しました');
+            const data = await res.json();
+            batch.forEach((item, i) => item.resolve(data.results[i]));
+        } catch (error) {
+            batch.forEach(item => item.reject(error));
+        }
+    }
+
+    function flush() {
+        clearTimeout(timer);
+        timer = null;
+        while (pending.length) {
+            send(pending.splice(0, MAX_BATCH));
+        }
+    }
+
+    function enqueue(op) {
+        return new Promise((resolve, reject) => {
+            pending.push({ op, resolve, reject });
+            if (pending.length >= MAX_BATCH) {
+                flush();
+            } else if (!timer) {
+                timer = setTimeout(flush, FLUSH_DELAY);
+            }
+        });
+    }
+
+    // タブを閉じる・移動する前に残りを送る
+    document.addEventListener('visibilitychange', function () {
+        if (document.visibilityState === 'hidden') flush();
+    });
+    window.addEventListener('pagehide', flush);
+
+    window.progressQueue = { enqueue, flush };
+})();
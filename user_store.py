@@ -0,0 +1,225 @@
+"""ユーザー（ログインアカウント）の保存先
+
+SQLite（WALモード）にメールアドレスを主キーとして保存し、メールアドレスでの検索は
+インデックスで行う。パスワードはソルト付きのハッシュ（werkzeug.security の pbkdf2）で持ち、
+反復回数は USER_HASH_ITERATIONS で変えられる。設定より少ない反復回数のハッシュは
+ログインに成功したときに作り直す。
+
+CSVから一括で取り込める（列: email,name,password。password の代わりに作成済みの
+password_hash 列でもよい）。件数が多いときは --iterations を小さくして取り込み、
+ログイン時の作り直しで設定の反復回数に上げる:
+    python -m user_store import users.csv [--db progress/users.db] [--iterations 1000]
+
+開発用のユーザー（user@example.com / testpass）は、ユーザーが1人もいないデータベースを
+アプリが最初に開いたときに登録する（SEED_DEV_USERS=0 で登録しない）。手動でも登録できる:
+    python -m user_store seed [--db progress/users.db]
+"""
+import argparse
+import csv
+import hashlib
+import os
+import sqlite3
+import sys
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from db import LocalConnection, create_schema
+
+USER_DB = os.environ.get("USER_DB", os.path.join("progress", "users.db"))
+# pbkdf2 の反復回数（大きいほど総当たりに強く、ログインは遅くなる）
+USER_HASH_ITERATIONS = int(os.environ.get("USER_HASH_ITERATIONS", "600000"))
+# load_user の結果を保持する秒数と件数
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "1024"))
+# 開発用のユーザー（seed で未登録なら追加する）
+DEV_USERS = {
+    "user@example.com": {"password": "testpass", "name": "受講生"}
+}
+# ユーザーが1人もいないときに DEV_USERS を登録する（本番で CSV から取り込む場合は 0 にする）
+SEED_DEV_USERS = os.environ.get("SEED_DEV_USERS", "1") == "1"
+# CSVの取り込みで1回のトランザクションに入れる行数
+IMPORT_BATCH_SIZE = 1000
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    password_hash TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def hash_password(password: str, iterations: int = USER_HASH_ITERATIONS) -> str:
+    return generate_password_hash(password, method=f"pbkdf2:sha256:{iterations}")
+
+
+def hash_iterations(password_hash: str) -> int:
+    """"pbkdf2:sha256:<反復回数>$..." の反復回数（読み取れなければ0）"""
+    method = password_hash.split("$", 1)[0].split(":")
+    try:
+        return int(method[2]) if method[0] == "pbkdf2" else 0
+    except (IndexError, ValueError):
+        return 0
+
+
+def is_supported_hash(password_hash: str) -> bool:
+    """werkzeug の check_password_hash で確認できる形式（pbkdf2 / scrypt）か"""
+    parts = password_hash.split("$", 2)
+    if len(parts) != 3 or not parts[1] or not parts[2]:
+        return False
+    method, *args = parts[0].split(":")
+    try:
+        if method == "pbkdf2":
+            return (len(args) <= 2 and (not args or args[0] in hashlib.algorithms_available)
+                    and (len(args) < 2 or int(args[1]) > 0))
+        if method == "scrypt":
+            return not args or (len(args) == 3 and all(int(a) > 0 for a in args))
+    except ValueError:
+        return False
+    return False
+
+
+class SqliteUserStore:
+    """SQLite（WALモード）に保存する"""
+
+    def __init__(self, db_path: str, iterations: int = USER_HASH_ITERATIONS):
+        self.db_path = db_path
+        self.iterations = iterations
+        self._connections = LocalConnection(db_path)
+        self._dummy_hash = None
+        # 接続はスレッドごとに最初に使うときに開く
+        create_schema(db_path, SQLITE_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def close(self):
+        """このスレッドの接続を閉じる"""
+        self._connections.close()
+
+    def get(self, email: str) -> dict | None:
+        """{"email", "name"}（登録されていなければNone）"""
+        row = self._connect().execute(
+            "SELECT email, name FROM users WHERE email = ?", (normalize_email(email),)).fetchone()
+        return {"email": row[0], "name": row[1]} if row else None
+
+    def authenticate(self, email: str, password: str) -> dict | None:
+        """メールアドレスとパスワードが正しければ {"email", "name"} を返す"""
+        email = normalize_email(email)
+        row = self._connect().execute(
+            "SELECT name, password_hash FROM users WHERE email = ?", (email,)).fetchone()
+        if row is None:
+            # 登録の有無で応答時間が変わらないよう、同じ重さの確認をしておく
+            if self._dummy_hash is None:
+                self._dummy_hash = hash_password("", self.iterations)
+            check_password_hash(self._dummy_hash, password)
+            return None
+        name, password_hash = row
+        try:
+            if not check_password_hash(password_hash, password):
+                return None
+        except ValueError:
+            # 対応していない形式のハッシュはログインできないものとして扱う
+            return None
+        if hash_iterations(password_hash) < self.iterations:
+            self._connect().execute("UPDATE users SET password_hash = ? WHERE email = ?",
+                                    (hash_password(password, self.iterations), email))
+        return {"email": email, "name": name}
+
+    def add(self, email: str, name: str, password: str):
+        """ユーザーを追加する（同じメールアドレスがあれば置き換える）"""
+        self.add_many([(email, name, hash_password(password, self.iterations))])
+
+    def add_many(self, rows) -> int:
+        """(email, name, password_hash) をまとめて追加し、件数を返す"""
+        rows = [(normalize_email(email), name or normalize_email(email), password_hash)
+                for email, name, password_hash in rows]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (email, name, password_hash) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def seed(self, users: dict):
+        """{email: {"password", "name"}} のうち未登録のユーザーだけ追加する（開発用の初期ユーザー）"""
+        for email, record in users.items():
+            if self.get(email) is None:
+                self.add(email, record.get("name", email), record["password"])
+
+    def import_csv(self, path: str, iterations: int | None = None) -> tuple:
+        """CSV（email,name,password または password_hash）を取り込む
+
+        (取り込んだ件数, 取り込まなかった行の (行番号, 理由) のリスト) を返す。
+        不正な行は飛ばすので、途中で失敗して一部だけ取り込まれることはない。
+        """
+        iterations = iterations or self.iterations
+        count = 0
+        batch = []
+        skipped = []
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                if not normalize_email(row.get("email")):
+                    skipped.append((reader.line_num, "email がありません"))
+                    continue
+                password_hash = row.get("password_hash")
+                if password_hash:
+                    if not is_supported_hash(password_hash):
+                        skipped.append((reader.line_num, "password_hash の形式に対応していません"))
+                        continue
+                elif row.get("password"):
+                    password_hash = hash_password(row["password"], iterations)
+                else:
+                    skipped.append((reader.line_num, "password も password_hash もありません"))
+                    continue
+                batch.append((row["email"], row.get("name"), password_hash))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    count += self.add_many(batch)
+                    batch = []
+        if batch:
+            count += self.add_many(batch)
+        return count, skipped
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ユーザーの保存先を管理する")
+    sub = parser.add_subparsers(dest="command", required=True)
+    importer = sub.add_parser("import", help="CSV（email,name,password）からユーザーを取り込む")
+    importer.add_argument("csv", help="CSVファイル")
+    importer.add_argument("--db", default=USER_DB, help="SQLiteファイル")
+    importer.add_argument("--iterations", type=int, default=USER_HASH_ITERATIONS,
+                          help="password 列をハッシュにする反復回数（ログイン時に設定の回数へ作り直す）")
+    seeder = sub.add_parser("seed", help="開発用のユーザー（user@example.com）を登録する")
+    seeder.add_argument("--db", default=USER_DB, help="SQLiteファイル")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        store = SqliteUserStore(args.db)
+        count, skipped = store.import_csv(args.csv, iterations=args.iterations)
+        print(f"{count}人のユーザーを {args.db} に取り込みました（登録済み {store.count()}人）")
+        for line, reason in skipped:
+            print(f"  {args.csv}:{line}: {reason}", file=sys.stderr)
+        if skipped:
+            print(f"{len(skipped)}行を取り込みませんでした", file=sys.stderr)
+            return 1
+    elif args.command == "seed":
+        store = SqliteUserStore(args.db)
+        store.seed(DEV_USERS)
+        print(f"開発用のユーザーを {args.db} に登録しました: {', '.join(DEV_USERS)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""lessons/*.md の変更の監視（再起動せずに内容を反映する）
+
+追加・変更・削除されたMarkdownだけについて、変換済みHTML（事前変換分を含む）と
+ソースのハッシュを破棄してその場で変換し直し、検索インデックスの本文を更新する。
+ETagはソースのハッシュから作るので、変更したページだけETagが変わる。
+ほかのレッスンのキャッシュ・描画済みページはそのまま使い続ける。
+
+Linuxでは inotify（ctypes経由）、使えない環境では mtime とサイズのポーリングで検知する。
+キャッシュはプロセスごとなので、gunicornではワーカーごとに起動する（gunicorn.conf.py）。
+環境変数 WATCH_LESSONS=1 で有効になる。
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+from content import LESSONS_DIR, invalidate_item, render_lesson_html
+from search_index import reindex_item
+
+WATCH_LESSONS = os.environ.get("WATCH_LESSONS", "0") == "1"
+# ポーリングの間隔（秒）
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", "1.0"))
+# エディタの保存（一時ファイルへの書き込みと名前の変更）をまとめて1回として扱う時間（秒）
+WATCH_DEBOUNCE = float(os.environ.get("WATCH_DEBOUNCE", "0.2"))
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0o2000000
+# 書き込み中のファイルを読まないよう、変更は IN_MODIFY ではなく閉じたとき（IN_CLOSE_WRITE）に検知する
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+logger = logging.getLogger(__name__)
+
+
+def item_id_for(name: str) -> str | None:
+    """ファイル名からレッスン・プロジェクトIDを返す（_で始まるテンプレートなどはNone）"""
+    if not name.endswith(".md") or name.startswith(("_", ".")):
+        return None
+    return name[:-len(".md")]
+
+
+def scan(directory: str) -> dict:
+    """ファイル名 -> (mtime, サイズ)"""
+    snapshot = {}
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return snapshot
+    for entry in entries:
+        if item_id_for(entry.name):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            snapshot[entry.name] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+class PollingWatcher:
+    """一定間隔でディレクトリを調べ、mtimeかサイズが変わったファイルを返す"""
+
+    def __init__(self, directory: str, interval: float = WATCH_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot = scan(directory)
+
+    def wait(self) -> set:
+        while True:
+            time.sleep(self.interval)
+            snapshot = scan(self.directory)
+            changed = {name for name in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(name) != self._snapshot.get(name)}
+            self._snapshot = snapshot
+            if changed:
+                return changed
+
+
+class InotifyWatcher:
+    """inotify でディレクトリ内の書き込み・作成・削除・名前の変更を受け取る"""
+
+    def __init__(self, directory: str, debounce: float = WATCH_DEBOUNCE):
+        self.directory = directory
+        self.debounce = debounce
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), INOTIFY_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed: {directory}")
+
+    def read_events(self) -> set:
+        """届いているイベントのファイル名（キューが溢れたときはすべてのファイル）"""
+        data = os.read(self.fd, 64 * 1024)
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return set(os.listdir(self.directory))
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def wait(self) -> set:
+        while True:
+            select.select([self.fd], [], [])
+            names = self.read_events()
+            # 続けて届くイベントをまとめる
+            while select.select([self.fd], [], [], self.debounce)[0]:
+                names |= self.read_events()
+            if any(item_id_for(name) for name in names):
+                return names
+
+
+def create_watcher(directory: str = LESSONS_DIR):
+    """inotifyが使えればそれを、使えなければポーリングを使う"""
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError, TypeError) as e:
+        logger.info("inotifyが使えないためポーリングで監視します: %s", e)
+        return PollingWatcher(directory)
+
+
+def reload_item(item_id: str) -> bool:
+    """1件分のキャッシュを破棄して変換し直し、検索インデックスを更新する"""
+    invalidate_item(item_id)
+    # 次のリクエストを待たずに変換しておく（削除されていれば何もしない）
+    render_lesson_html(item_id)
+    return reindex_item(item_id)
+
+
+def reload_changed(names: set) -> list:
+    """変更されたファイル名から該当するIDを読み直し、そのIDのリストを返す"""
+    item_ids = sorted({item_id for item_id in map(item_id_for, names) if item_id})
+    for item_id in item_ids:
+        try:
+            reload_item(item_id)
+        except Exception:
+            # 書きかけのファイルなどで失敗しても監視は続ける（次の保存で読み直す）
+            logger.exception("レッスンの再読み込みに失敗しました: %s", item_id)
+    return item_ids
+
+
+class LessonWatcher(threading.Thread):
+    """変更を待ち、該当するレッスンだけ読み直すデーモンスレッド"""
+
+    def __init__(self, directory: str = LESSONS_DIR):
+        super().__init__(name="lesson-watcher", daemon=True)
+        self.watcher = create_watcher(directory)
+
+    def run(self):
+        while True:
+            item_ids = reload_changed(self.watcher.wait())
+            if item_ids:
+                logger.info("レッスンを再読み込みしました: %s", ", ".join(item_ids))
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def start_watcher(directory: str = LESSONS_DIR) -> LessonWatcher:
+    """監視スレッドを起動する（プロセスごとに1つ）"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = LessonWatcher(directory)
+            _watcher.start()
+    return _watcher